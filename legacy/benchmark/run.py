@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+"""Run the MoonBit benchmarks on every backend and track their results.
+
+Workloads are listed in workloads.json: a moon project, the moon command
+that runs it (``run <package>`` or ``test``) and the targets to run it on.
+Each workload is built once per target in release mode, run a few times to
+warm up, then timed over several repetitions.
+
+``run`` workloads are timed by running the built artifact directly, with
+moonrun, node or as an executable, so moon's build check is not counted.
+``test`` workloads can only run through ``moon test``: the cost of an empty
+test package (harness/), timed the same way, is subtracted for each of
+their test packages, leaving mostly the time of the tests themselves.
+Results record which method was used, and are only compared with results
+measured the same way.
+
+Every run is appended to the history, _build/history.json by default, and
+compared against a baseline run from the history (by default, the previous
+run on the same machine).
+
+    python legacy/benchmark/run.py
+    python legacy/benchmark/run.py fib sudoku --target native --repeat 20
+    python legacy/benchmark/run.py --baseline 2024-06-01 --threshold 0.05
+"""
+
+import argparse
+import json
+import os
+import platform
+import re
+import shutil
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+BENCHMARK_DIR = Path(__file__).resolve().parent
+ROOT_DIR = BENCHMARK_DIR.parent.parent
+WORKLOADS_PATH = BENCHMARK_DIR / "workloads.json"
+HISTORY_PATH = BENCHMARK_DIR / "_build" / "history.json"
+HARNESS_DIR = BENCHMARK_DIR / "harness"
+# Maps a target to the median time of moon test on the harness, or an error.
+HARNESS_COSTS = {}
+TARGETS = ["wasm", "wasm-gc", "js", "native"]
+# Suffix of the artifact of a main package under target/<target>/release/build.
+ARTIFACT_SUFFIXES = {"wasm": ".wasm", "wasm-gc": ".wasm", "js": ".js", "native": ".exe"}
+TEST_BLOCK = re.compile(r"^test\b", re.MULTILINE)
+IGNORED_DIRS = {"target", ".mooncakes", "_build"}
+WARMUP = 2
+REPEAT = 10
+# A workload regresses when its median is this much slower than the baseline.
+THRESHOLD = 0.10
+
+
+def load_workloads():
+    with open(WORKLOADS_PATH, "r") as file:
+        return json.load(file)
+
+
+def load_history(path):
+    try:
+        with open(path, "r") as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return []
+
+
+def save_history(path, history):
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    temp_path = Path(path).with_suffix(".tmp")
+    temp_path.write_text(json.dumps(history, indent=1) + "\n")
+    os.replace(temp_path, path)
+
+
+def moon_version():
+    """Return the moon toolchain version, or an empty string if unavailable."""
+    try:
+        result = subprocess.run(
+            ["moon", "version", "--all"], capture_output=True, text=True, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+    return result.stdout.strip()
+
+
+def git_commit():
+    result = subprocess.run(
+        ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR, capture_output=True, text=True)
+    return result.stdout.strip()
+
+
+def machine():
+    return f"{platform.node()} {platform.system()} {platform.machine()}"
+
+
+def command(workload, target):
+    action, *args = workload["command"]
+    return ["moon", action, "--release", "--target", target, *args]
+
+
+def artifact_command(workload, target):
+    """Return the command running the built main package of a run workload."""
+    package = workload["command"][1]
+    artifact = (
+        ROOT_DIR / workload["project"] / "target" / target / "release" / "build"
+        / package / f"{Path(package).name}{ARTIFACT_SUFFIXES[target]}"
+    )
+    if target in ("wasm", "wasm-gc"):
+        return [shutil.which("moonrun") or "moonrun", str(artifact)], artifact
+    if target == "js":
+        return ["node", str(artifact)], artifact
+    return [str(artifact)], artifact
+
+
+def test_packages(project):
+    """Return the number of packages of a project that have tests."""
+    count = 0
+    for root, dirs, files in os.walk(project):
+        dirs[:] = [name for name in dirs if name not in IGNORED_DIRS]
+        if "moon.pkg.json" not in files:
+            continue
+        sources = [name for name in files if name.endswith((".mbt", ".mbt.md"))]
+        if any(TEST_BLOCK.search((Path(root) / name).read_text(encoding="utf-8")) for name in sources):
+            count += 1
+    return count
+
+
+def summarize(samples):
+    """Return summary statistics of timing samples, in seconds."""
+    median = statistics.median(samples)
+    return {
+        "samples": [round(sample, 6) for sample in samples],
+        "min": round(min(samples), 6),
+        "max": round(max(samples), 6),
+        "mean": round(statistics.fmean(samples), 6),
+        "median": round(median, 6),
+        "stdev": round(statistics.stdev(samples), 6) if len(samples) > 1 else 0.0,
+        # Median absolute deviation, robust to the odd slow run.
+        "mad": round(statistics.median(abs(sample - median) for sample in samples), 6),
+    }
+
+
+def measure(args, cwd, warmup, repeat):
+    """Time a command, returning its samples, or an error message if it fails."""
+    samples = []
+    for iteration in range(warmup + repeat):
+        start = time.perf_counter()
+        result = subprocess.run(args, cwd=cwd, capture_output=True, text=True)
+        elapsed = time.perf_counter() - start
+        if result.returncode != 0:
+            return None, (result.stdout + result.stderr).strip() or f"{' '.join(args)} failed"
+        if iteration >= warmup:
+            samples.append(elapsed)
+    return samples, None
+
+
+def harness_cost(target, warmup, repeat):
+    """Return the median time of moon test on an empty test package, or an error."""
+    if target not in HARNESS_COSTS:
+        samples, error = measure(
+            ["moon", "test", "--release", "--target", target], HARNESS_DIR, warmup, repeat)
+        HARNESS_COSTS[target] = (statistics.median(samples) if samples else None, error)
+    return HARNESS_COSTS[target]
+
+
+def run_benchmark(workload, target, warmup, repeat):
+    """Build and time one workload on one target.
+
+    Returns its summary statistics, or an error message if it fails.
+    """
+    cwd = ROOT_DIR / workload["project"]
+    build = subprocess.run(
+        ["moon", "build", "--release", "--target", target],
+        cwd=cwd, capture_output=True, text=True)
+    if build.returncode != 0:
+        return None, (build.stdout + build.stderr).strip() or "moon build failed"
+    if workload["command"][0] == "run":
+        args, artifact = artifact_command(workload, target)
+        if not artifact.exists():
+            return None, f"no build artifact at {artifact}"
+        samples, error = measure(args, cwd, warmup, repeat)
+        if error is not None:
+            return None, error
+        summary = summarize(samples)
+        summary["method"] = "artifact"
+        return summary, None
+
+    samples, error = measure(command(workload, target), cwd, warmup, repeat)
+    if error is not None:
+        return None, error
+    cost, error = harness_cost(target, warmup, repeat)
+    if error is not None:
+        return None, f"empty test package failed: {error}"
+    overhead = cost * test_packages(cwd)
+    summary = summarize([max(sample - overhead, 0.0) for sample in samples])
+    summary["method"] = "moon test minus harness"
+    summary["harness"] = round(overhead, 6)
+    return summary, None
+
+
+def find_baseline(history, baseline):
+    """Return the history entry to compare against, or None.
+
+    baseline is "previous" for the latest run on this machine, or a prefix
+    of a run's id (its start time) or commit.
+    """
+    if baseline == "previous":
+        runs = [entry for entry in history if entry["machine"] == machine()]
+        return runs[-1] if runs else None
+    for entry in reversed(history):
+        if entry["id"].startswith(baseline) or entry["commit"].startswith(baseline):
+            return entry
+    return None
+
+
+def comparable(baseline, key, current):
+    """Return the baseline result of a benchmark if it was measured the same way."""
+    previous = baseline["results"].get(key) if baseline else None
+    if current is None or previous is None or previous.get("method") != current.get("method"):
+        return None
+    # A test workload that is all harness has nothing left to compare.
+    return previous if previous["median"] > 0 else None
+
+
+def regressions(results, baseline, threshold):
+    """Return the benchmarks slower than the baseline, with their slowdowns.
+
+    A benchmark regresses when its median is more than threshold slower and
+    even its fastest run is slower than the baseline median, so a single
+    noisy repetition does not count. Results measured differently, such as
+    those of older runs that timed the whole moon command, are not compared.
+    """
+    found = []
+    for key, current in results.items():
+        previous = comparable(baseline, key, current)
+        if previous is None:
+            continue
+        ratio = current["median"] / previous["median"]
+        if ratio > 1 + threshold and current["min"] > previous["median"]:
+            found.append((key, ratio))
+    return found
+
+
+def main():
+    workloads = load_workloads()
+    parser = argparse.ArgumentParser(description="Run the MoonBit benchmarks across backends")
+    parser.add_argument(
+        "workloads",
+        nargs="*",
+        help=f"workloads to run: {', '.join(workloads)} (default: all)")
+    parser.add_argument(
+        "-t", "--target",
+        action="append",
+        choices=TARGETS,
+        help="target to run on, may be repeated (default: every target of the workload)")
+    parser.add_argument(
+        "--warmup",
+        type=int,
+        default=WARMUP,
+        help=f"untimed runs before measuring (default: {WARMUP})")
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=REPEAT,
+        help=f"timed runs (default: {REPEAT})")
+    parser.add_argument(
+        "--history",
+        default=HISTORY_PATH,
+        help="JSON history file (default: _build/history.json next to this script)")
+    parser.add_argument(
+        "--baseline",
+        default="previous",
+        help='run to compare against: "previous" or a run id or commit prefix (default: previous)')
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=THRESHOLD,
+        help=f"relative slowdown of the median reported as a regression (default: {THRESHOLD})")
+    parser.add_argument(
+        "--no-save",
+        action="store_true",
+        help="do not append this run to the history")
+    args = parser.parse_args()
+    unknown = [name for name in args.workloads if name not in workloads]
+    if unknown:
+        parser.error(f"unknown workloads: {', '.join(unknown)}")
+
+    history = load_history(args.history)
+    baseline = find_baseline(history, args.baseline)
+    entry = {
+        "id": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "moon_version": moon_version(),
+        "machine": machine(),
+        "warmup": args.warmup,
+        "repeat": args.repeat,
+        "results": {},
+    }
+
+    failed = []
+    # Benchmarks run one at a time so they do not compete for the CPU.
+    for name in args.workloads or workloads:
+        workload = workloads[name]
+        for target in workload["targets"]:
+            if args.target and target not in args.target:
+                continue
+            key = f"{name}/{target}"
+            print(f"Running {key}", flush=True)
+            summary, error = run_benchmark(workload, target, args.warmup, args.repeat)
+            if error is not None:
+                print(f"FAIL: {key}\n{error}")
+                failed.append(key)
+                continue
+            entry["results"][key] = summary
+            line = f"  median {summary['median'] * 1000:.1f} ms, mad {summary['mad'] * 1000:.1f} ms, " \
+                f"min {summary['min'] * 1000:.1f} ms, max {summary['max'] * 1000:.1f} ms"
+            if "harness" in summary:
+                line += f" (after {summary['harness'] * 1000:.1f} ms of moon test harness)"
+            previous = comparable(baseline, key, summary)
+            if previous is not None:
+                line += f" ({(summary['median'] / previous['median'] - 1) * 100:+.1f}% vs baseline)"
+            print(line)
+
+    if not args.no_save and entry["results"]:
+        history.append(entry)
+        save_history(args.history, history)
+
+    found = regressions(entry["results"], baseline, args.threshold) if baseline else []
+    if baseline is None:
+        print("\nNo baseline to compare against")
+    elif found:
+        print(f"\nRegressions against {baseline['id']} ({baseline['commit']}):")
+        for key, ratio in found:
+            print(f"  {key}: {(ratio - 1) * 100:+.1f}%")
+    else:
+        print(f"\nNo regressions against {baseline['id']} ({baseline['commit']})")
+    if failed:
+        print(f"Failed: {', '.join(failed)}")
+    return 1 if found or failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,57 +1,227 @@
+import os
+import re
+import json
+import time
+import hashlib
 import tempfile
 import subprocess
+from pathlib import Path
 from docutils.nodes import document, Node, NodeVisitor
+from docutils.utils import get_source_line
 from sphinx.application import Sphinx
+from sphinx.environment import BuildEnvironment
 from sphinx.util.typing import ExtensionMetadata
 from sphinx.util import logging
+from moonc_service import CheckService
 
 logger = logging.getLogger(__name__)
 
+# Stands in for the temporary file name in recorded diagnostics.
+PLACEHOLDER = "<code block>"
+MOONC_VERSION = ""
+SERVICE = CheckService()
+# Check results of previous builds, keyed by block hash.
+CACHE : dict[str, dict] = {}
+
 def setup(app: Sphinx) -> ExtensionMetadata:
     metadata = {
         "version": "0.1.0",
         "parallel_read_safe": True,
         "parallel_write_safe": True,
     }
-    try:
-        result = subprocess.run(["moonc", '-v'], capture_output=True, check=True)
-    except (FileNotFoundError, subprocess.CalledProcessError):
+    if "moonbit_cache_dir" not in app.config:
+        app.add_config_value("moonbit_cache_dir", "_build/cache", "env")
+    app.add_config_value("moonbit_check_cache_size", 10000, "env")
+    global MOONC_VERSION
+    MOONC_VERSION = SERVICE.version(Path(app.confdir) / app.config.moonbit_cache_dir / "toolchain.json")
+    if not MOONC_VERSION:
         logger.warning("moonbit compiler is missing! No code check performed")
         return metadata
-    logger.info(f"moonc version: {result.stdout.decode().strip()}")
+    logger.info(f"moonc version: {MOONC_VERSION}")
+    app.connect("builder-inited", load_cache)
+    app.connect("env-before-read-docs", reset_stats)
+    app.connect("env-merge-info", merge_stats)
     app.connect("doctree-read", source_read_handler)
+    app.connect("build-finished", save_cache)
     return metadata
 
+class Block:
+    """A code block to check, wrapped into a standalone MoonBit source file."""
+    def __init__(self, node : Node, mode : str):
+        self.node = node
+        if mode == 'expr':
+            # Check as expression
+            self.source = "fn init {\n" + "\n".join(["  " + line for line in node.astext().splitlines()]) + "\n}"
+            self.line_offset = 1
+        else:
+            # Check as top-level
+            self.source = node.astext()
+            self.line_offset = 0
+        self.key = hashlib.sha256("\0".join([MOONC_VERSION, mode, node.astext()]).encode()).hexdigest()
+        self.messages : list[str] = []
+
 class Visitor(NodeVisitor):
+    def __init__(self, doctree : document):
+        super().__init__(doctree)
+        self.blocks : list[Block] = []
+
     def visit_literal_block(self, node : Node):
         if 'language' in node.attributes \
             and (node.attributes['language'] == 'moonbit' or node.attributes['language'] == 'mbt') \
             and 'classes' in node.attributes:
                 if node.attributes['classes'].count('expr') > 0:
-                    # Check as expression
-                    with tempfile.NamedTemporaryFile(suffix=".mbt") as temp_file:
-                        temp_file.write("fn init {\n".encode())
-                        temp_file.write("\n".join(["  " + line for line in node.astext().splitlines()]).encode())
-                        temp_file.write("\n}".encode())
-                        temp_file.flush()
-                        temp_file_path = temp_file.name
-
-                        result = subprocess.run(["moonc", "compile", "-stop-after-parsing", temp_file_path], capture_output=True)
-                        if result.returncode != 0:
-                            logger.error(f"code check failed: {result.stderr.decode().strip()}")
-
+                    self.blocks.append(Block(node, 'expr'))
                 elif node.attributes['classes'].count('top-level') > 0:
-                     # Check as top-level
-                    with tempfile.NamedTemporaryFile(suffix=".mbt") as temp_file:
-                        temp_file.write(node.astext().encode())
-                        temp_file.flush()
-                        temp_file_path = temp_file.name
-                    
-                        result = subprocess.run(["moonc", "compile", "-stop-after-parsing", temp_file_path], capture_output=True)
-                        if result.returncode != 0:
-                            logger.error(f"code check failed: {result.stderr.decode().strip()}", location=node)
+                    self.blocks.append(Block(node, 'top-level'))
     def unknown_visit(self, _node):
         return
 
-def source_read_handler(_app : Sphinx, doctree: document):
-    doctree.walk(Visitor(doctree))
+def split_diagnostics(output : str, paths : list[str]) -> dict[str, list[str]]:
+    """Group compiler output lines into diagnostics, keyed by the file they mention."""
+    diagnostics : dict[str, list[str]] = {}
+    chunks : list[list[str]] = []
+    for line in output.splitlines():
+        if not chunks or re.match(r"^(Error|Warning)\b", line) \
+            or any(line.startswith(path + ":") for path in paths):
+            chunks.append([])
+        chunks[-1].append(line)
+    for chunk in chunks:
+        text = "\n".join(chunk)
+        for path in paths:
+            if path + ":" in text:
+                diagnostics.setdefault(path, []).append(text)
+                break
+    return diagnostics
+
+def content_line(node : Node) -> tuple[str, int | None]:
+    """Return the source file and the line where the code of a block starts."""
+    source, line = get_source_line(node)
+    if source is None or line is None:
+        return source, line
+    # The node points at the opening fence; skip it and any directive options.
+    first = next(iter(node.astext().splitlines()), "").strip()
+    try:
+        lines = Path(source).read_text().splitlines()
+    except OSError:
+        return source, line
+    for index in range(line - 1, min(len(lines), line + 20)):
+        if first and lines[index].strip() == first:
+            return source, index + 1
+    return source, line
+
+def report(block : Block):
+    """Log diagnostics of a block at the corresponding line of the document."""
+    if not block.messages:
+        return
+    # Finding the line reads the whole document, so only do it for failures.
+    source, start = content_line(block.node)
+    for message in block.messages:
+        line = start
+        match = re.search(re.escape(PLACEHOLDER) + r":(\d+)", message)
+        if match and line is not None:
+            line += max(int(match.group(1)) - block.line_offset, 1) - 1
+        # Without a source line, let Sphinx locate the node as well as it can.
+        location = block.node if source is None or line is None else f"{source}:{line}"
+        logger.error(f"code check failed: {message.strip()}", location=location)
+
+def compile_blocks(blocks : list[Block], directory : Path) -> tuple[subprocess.CompletedProcess, list[str]]:
+    """Parse all blocks with a single moonc invocation."""
+    paths = []
+    for index, block in enumerate(blocks):
+        path = directory / f"block{index}.mbt"
+        path.write_text(block.source)
+        paths.append(str(path))
+    return SERVICE.parse(paths).result(), paths
+
+def check_blocks(blocks : list[Block]):
+    """Check blocks in as few moonc invocations as possible, filling in their messages.
+
+    A failing batch records the blocks its diagnostics point at and re-checks
+    the rest, so every block is still verified if the compiler stops early.
+    """
+    pending = blocks
+    with tempfile.TemporaryDirectory() as directory:
+        while pending:
+            result, paths = compile_blocks(pending, Path(directory))
+            if result.returncode == 0:
+                return
+            diagnostics = split_diagnostics(result.stderr + result.stdout, paths)
+            if not diagnostics:
+                if len(pending) == 1:
+                    pending[0].messages = [result.stderr.replace(paths[0], PLACEHOLDER)]
+                    return
+                # The diagnostics cannot be attributed, so check blocks one by one.
+                for block in pending:
+                    check_blocks([block])
+                return
+            for block, path in zip(pending, paths):
+                if path in diagnostics:
+                    block.messages = [message.replace(path, PLACEHOLDER) for message in diagnostics[path]]
+            pending = [block for block, path in zip(pending, paths) if path not in diagnostics]
+
+def source_read_handler(app : Sphinx, doctree: document):
+    visitor = Visitor(doctree)
+    doctree.walk(visitor)
+    env = app.env
+    unchecked = []
+    for block in visitor.blocks:
+        if block.key in env.moonbit_check_results:
+            block.messages = env.moonbit_check_results[block.key]
+            env.moonbit_check_hits += 1
+        elif block.key in CACHE:
+            block.messages = CACHE[block.key]["messages"]
+            env.moonbit_check_hits += 1
+            env.moonbit_check_results[block.key] = block.messages
+        else:
+            unchecked.append(block)
+    if unchecked:
+        check_blocks(unchecked)
+        env.moonbit_check_misses += len(unchecked)
+        for block in unchecked:
+            env.moonbit_check_results[block.key] = block.messages
+    for block in visitor.blocks:
+        report(block)
+
+def cache_path(app : Sphinx) -> Path:
+    return Path(app.confdir) / app.config.moonbit_cache_dir / "check.json"
+
+def read_cache(app : Sphinx) -> dict[str, dict]:
+    try:
+        return json.loads(cache_path(app).read_text())
+    except (OSError, ValueError):
+        return {}
+
+def load_cache(app : Sphinx):
+    global CACHE
+    CACHE = read_cache(app)
+
+def reset_stats(_app : Sphinx, env : BuildEnvironment, _docnames):
+    # Results of this build; the worker processes of a parallel read send
+    # theirs back through env-merge-info.
+    env.moonbit_check_results = {}
+    env.moonbit_check_hits = 0
+    env.moonbit_check_misses = 0
+
+def merge_stats(_app : Sphinx, env : BuildEnvironment, _docnames, other : BuildEnvironment):
+    env.moonbit_check_results.update(other.moonbit_check_results)
+    env.moonbit_check_hits += other.moonbit_check_hits
+    env.moonbit_check_misses += other.moonbit_check_misses
+
+def save_cache(app : Sphinx, _exception):
+    env = app.env
+    if not hasattr(env, "moonbit_check_results"):
+        return
+    # Keep entries written by other builds sharing the cache in the meantime.
+    for key, entry in read_cache(app).items():
+        if key not in CACHE or CACHE[key]["used"] < entry["used"]:
+            CACHE[key] = entry
+    now = time.time()
+    for key, messages in env.moonbit_check_results.items():
+        CACHE[key] = {"messages": messages, "used": now}
+    entries = sorted(CACHE.items(), key=lambda item: item[1]["used"], reverse=True)
+    path = cache_path(app)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = path.with_suffix(f".{os.getpid()}.tmp")
+    temp_path.write_text(json.dumps(dict(entries[:app.config.moonbit_check_cache_size])))
+    os.replace(temp_path, path)
+    logger.info(f"code check cache: {env.moonbit_check_hits} hits, {env.moonbit_check_misses} misses")
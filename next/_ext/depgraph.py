@@ -0,0 +1,272 @@
+"""Dependency graph from pages to the example files and projects they include.
+
+Pages pull code in with ``literalinclude`` and other pages in with ``include``.
+The graph records, for every page, the files it includes and, for every
+included file, its content hash and the moon project owning it. It is written
+next to the doctrees, since the hashes are those the environment last read,
+and updated after each build for the pages it read. It answers which pages
+and which projects a change affects:
+
+- As a Sphinx extension, pages whose included files changed since the last
+  build are marked outdated, even when file modification times do not show it
+  (fresh checkouts, restored caches, reverted edits).
+- ``scripts/check-document.py --changed-since`` uses it to pick the projects
+  to check.
+- From the command line::
+
+    python _ext/depgraph.py affected sources/language/src/builtin/top.mbt
+    python _ext/depgraph.py build
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+from pathlib import Path
+
+DOCS_DIR = Path(__file__).resolve().parent.parent
+# The graph of the default build, as written by make html.
+GRAPH_PATH = DOCS_DIR / "_build" / "doctrees" / "depgraph.json"
+INCLUDE = re.compile(r"\{(?:literalinclude|include)\}\s+(\S+)")
+# Directories holding included files rather than pages.
+SOURCE_DIRS = {"sources", "snippets"}
+IGNORED_DIRS = {"_build", "_ext", "download", "locales", "target", ".mooncakes", ".venv"}
+VERSION = 1
+# Docnames read by the current build.
+READ_DOCS = None
+
+def pages(docs_dir : Path = DOCS_DIR) -> list[str]:
+    """Return the Markdown pages of the docs, relative to docs_dir."""
+    result = []
+    for root, dirs, files in os.walk(docs_dir):
+        dirs[:] = sorted(
+            d for d in dirs
+            if d not in IGNORED_DIRS and not d.startswith(".")
+            and not (Path(root) == docs_dir and d in SOURCE_DIRS)
+        )
+        for name in sorted(files):
+            if name.endswith(".md"):
+                result.append(relative(Path(root) / name, docs_dir))
+    return result
+
+def relative(path : Path, docs_dir : Path = DOCS_DIR) -> str:
+    return Path(os.path.relpath(path, docs_dir)).as_posix()
+
+def includes(page : str, docs_dir : Path = DOCS_DIR) -> list[str]:
+    """Return the files a page includes, relative to docs_dir."""
+    try:
+        text = (docs_dir / page).read_text(encoding="utf-8")
+    except OSError:
+        return []
+    result = []
+    for match in INCLUDE.finditer(text):
+        target = match.group(1)
+        if target.startswith("/"):
+            path = docs_dir / target.lstrip("/")
+        else:
+            path = (docs_dir / page).parent / target
+        path = relative(os.path.normpath(path), docs_dir)
+        if path not in result:
+            result.append(path)
+    return result
+
+def project(path : str, docs_dir : Path = DOCS_DIR) -> str | None:
+    """Return the moon project owning a file, relative to docs_dir.
+
+    That is the workspace containing it if there is one, or else the nearest
+    module. Files directly in an example directory without a module, such as
+    ``sources/single-file``, belong to that directory.
+    """
+    parts = Path(path).parts
+    if len(parts) < 3 or parts[0] not in SOURCE_DIRS:
+        return None
+    module = workspace = None
+    for depth in range(len(parts) - 1, 1, -1):
+        directory = docs_dir.joinpath(*parts[:depth])
+        if module is None and (directory / "moon.mod.json").exists():
+            module = depth
+        if (directory / "moon.work").exists():
+            workspace = depth
+    depth = workspace or module or 2
+    return Path(*parts[:depth]).as_posix()
+
+def file_hash(path : Path) -> str | None:
+    try:
+        return hashlib.sha256(path.read_bytes()).hexdigest()
+    except OSError:
+        return None
+
+def scan(docs_dir : Path = DOCS_DIR) -> dict:
+    """Build the graph of the current tree."""
+    graph = {"version": VERSION, "pages": {}, "files": {}}
+    rescan(graph, pages(docs_dir), docs_dir)
+    return graph
+
+def rescan(graph : dict, changed : list[str], docs_dir : Path = DOCS_DIR):
+    """Update a graph in place for changed pages, relative to docs_dir.
+
+    The includes of the changed pages are read again and their files hashed
+    again; pages that no longer exist are dropped, with the files only they
+    included.
+    """
+    queue = list(changed)
+    seen = set(queue)
+    while queue:
+        page = queue.pop()
+        if not (docs_dir / page).exists():
+            continue
+        graph["pages"][page] = includes(page, docs_dir)
+        for path in graph["pages"][page]:
+            if path.endswith(".md") and path not in seen:
+                # Included pages may include code themselves.
+                seen.add(path)
+                queue.append(path)
+    graph["pages"] = {
+        page: deps for page, deps in sorted(graph["pages"].items())
+        if (docs_dir / page).exists()
+    }
+    used = {path for deps in graph["pages"].values() for path in deps}
+    stale = {path for page in seen for path in graph["pages"].get(page, [])}
+    files = {
+        path: info for path, info in graph["files"].items()
+        if path in used and path not in stale
+    }
+    for path in used - set(files):
+        files[path] = {
+            "hash": file_hash(docs_dir / path),
+            "project": project(path, docs_dir),
+        }
+    graph["files"] = dict(sorted(files.items()))
+
+def load(path : Path = GRAPH_PATH) -> dict | None:
+    try:
+        with open(path, "r") as file:
+            graph = json.load(file)
+    except (OSError, ValueError):
+        return None
+    return graph if graph.get("version") == VERSION else None
+
+def save(graph : dict, path : Path = GRAPH_PATH):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = path.with_suffix(f".{os.getpid()}.tmp")
+    temp_path.write_text(json.dumps(graph, indent=1) + "\n")
+    os.replace(temp_path, path)
+
+def changed_files(graph : dict, docs_dir : Path = DOCS_DIR) -> list[str]:
+    """Return the included files whose content differs from the graph."""
+    return [
+        path for path, info in graph["files"].items()
+        if file_hash(docs_dir / path) != info["hash"]
+    ]
+
+def affected(graph : dict, paths : list[str], docs_dir : Path = DOCS_DIR) -> dict:
+    """Return the pages and projects affected by changes to paths.
+
+    Paths are relative to docs_dir; a directory stands for everything in it.
+    Affected pages are the changed pages and every page including a changed
+    file, directly or through an included page. Affected projects own a
+    changed file or a file included by a changed page.
+    """
+    prefixes = [path.rstrip("/") for path in paths]
+    def matches(path):
+        return any(path == prefix or path.startswith(prefix + "/") for prefix in prefixes)
+
+    dirty = {path for path in list(graph["pages"]) + list(graph["files"]) if matches(path)}
+    dirty |= set(paths)
+    result_pages = set()
+    changed = True
+    while changed:
+        changed = False
+        for page, deps in graph["pages"].items():
+            if page not in result_pages and (page in dirty or dirty.intersection(deps)):
+                result_pages.add(page)
+                dirty.add(page)
+                changed = True
+
+    projects = {project(path, docs_dir) for path in dirty}
+    for page in result_pages:
+        if page in paths or matches(page):
+            # The page itself changed: its examples may have to be checked again.
+            projects |= {graph["files"].get(path, {}).get("project") for path in graph["pages"][page]}
+    # Pages included by other pages are not documents on their own.
+    included = {path for deps in graph["pages"].values() for path in deps}
+    return {
+        "pages": sorted(page for page in result_pages if page not in included),
+        "projects": sorted(name for name in projects if name is not None),
+    }
+
+def setup(app):
+    app.connect("env-get-outdated", outdated)
+    app.connect("env-before-read-docs", remember_read)
+    app.connect("build-finished", update)
+    return {
+        "version": "0.1.0",
+        "parallel_read_safe": True,
+        "parallel_write_safe": True,
+    }
+
+def graph_path(app) -> Path:
+    # Each environment, such as each locale's, compares against its own graph.
+    return Path(app.doctreedir) / "depgraph.json"
+
+def outdated(app, env, added, changed, removed):
+    graph = load(graph_path(app))
+    if graph is None:
+        return []
+    docs_dir = Path(app.srcdir)
+    result = affected(graph, changed_files(graph, docs_dir), docs_dir)
+    docnames = [page.removesuffix(".md") for page in result["pages"]]
+    return [
+        docname for docname in docnames
+        if docname in env.found_docs and docname not in added and docname not in changed
+    ]
+
+def remember_read(app, env, docnames):
+    global READ_DOCS
+    READ_DOCS = list(docnames)
+
+def update(app, exception):
+    if exception is not None:
+        return
+    docs_dir = Path(app.srcdir)
+    graph = load(graph_path(app))
+    if graph is None:
+        graph = scan(docs_dir)
+    elif not READ_DOCS:
+        # Nothing was read, so the graph still describes every page.
+        return
+    else:
+        rescan(graph, [relative(app.env.doc2path(docname), docs_dir) for docname in READ_DOCS], docs_dir)
+    save(graph, graph_path(app))
+
+def main():
+    parser = argparse.ArgumentParser(description="Dependency graph from docs pages to example projects")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("build", help=f"scan the docs and write {relative(GRAPH_PATH)}")
+    query = commands.add_parser("affected", help="list the pages and projects affected by changes to paths")
+    query.add_argument("paths", nargs="+", help="changed files or directories")
+    query.add_argument("--json", action="store_true", help="print the result as JSON")
+    args = parser.parse_args()
+
+    graph = scan()
+    if args.command == "build":
+        save(graph)
+        print(f"{len(graph['pages'])} pages including {len(graph['files'])} files, written to {GRAPH_PATH}")
+        return 0
+    paths = [relative(Path(path).resolve()) for path in args.paths]
+    result = affected(graph, paths)
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print("Pages:")
+        for page in result["pages"]:
+            print(f"  {page}")
+        print("Projects:")
+        for name in result["projects"]:
+            print(f"  {name}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
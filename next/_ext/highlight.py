@@ -0,0 +1,138 @@
+"""Content-addressed cache of highlighted code blocks.
+
+The en, zh_CN and ja builds highlight the same code, so rendered fragments are
+stored under ``moonbit_cache_dir`` and shared by every locale and rebuild. An
+entry is keyed by the code, the language, the highlighting options, the
+formatter and the versions of Pygments and of our MoonBit lexer.
+
+Blocks whose highlighting logged a warning are not cached, so the warning is
+reported again on the next build.
+"""
+
+import hashlib
+import json
+import logging as std_logging
+import multiprocessing
+import os
+import time
+from pathlib import Path
+import pygments
+from sphinx.application import Sphinx
+from sphinx.util.typing import ExtensionMetadata
+from sphinx.util import logging
+import lexer
+
+logger = logging.getLogger(__name__)
+
+LEXER_VERSION = hashlib.sha256(Path(lexer.__file__).read_bytes()).hexdigest()
+# Hits and misses of this build. Blocks are highlighted while writing, where
+# env-merge-info does not run, so the counters live in shared memory that the
+# forked writer processes of a parallel build update in place.
+STATS = None
+
+class WarningFlag(std_logging.Filter):
+    """Remembers whether the highlighter logged a warning."""
+    def __init__(self):
+        super().__init__()
+        self.raised = False
+
+    def filter(self, record):
+        if record.levelno >= std_logging.WARNING:
+            self.raised = True
+        return True
+
+def setup(app: Sphinx) -> ExtensionMetadata:
+    if "moonbit_cache_dir" not in app.config:
+        app.add_config_value("moonbit_cache_dir", "_build/cache", "env")
+    app.add_config_value("moonbit_highlight_cache_size", 20000, "")
+    app.connect("builder-inited", wrap_highlighter)
+    app.connect("build-finished", report)
+    return {
+        "version": "0.1.0",
+        "parallel_read_safe": True,
+        "parallel_write_safe": True,
+    }
+
+def cache_dir(app : Sphinx) -> Path:
+    return Path(app.confdir) / app.config.moonbit_cache_dir / "highlight"
+
+def wrap_highlighter(app : Sphinx):
+    highlighter = getattr(app.builder, "highlighter", None)
+    if highlighter is None:
+        return
+    directory = cache_dir(app)
+    directory.mkdir(parents=True, exist_ok=True)
+    global STATS
+    STATS = multiprocessing.Array("q", 2)
+    flag = WarningFlag()
+    std_logging.getLogger("sphinx.sphinx.highlighting").addFilter(flag)
+    highlight_block = highlighter.highlight_block
+    formatter = highlighter.formatter
+    formatter_id = [formatter.__module__, formatter.__qualname__, highlighter.formatter_args]
+
+    def cached(source, lang, opts=None, force=False, location=None, **kwargs):
+        key = hashlib.sha256(json.dumps(
+            [source, lang, opts, force, kwargs, highlighter.dest, formatter_id, pygments.__version__, LEXER_VERSION],
+            sort_keys=True, default=repr,
+        ).encode()).hexdigest()
+        path = directory / key[:2] / key
+        try:
+            result = path.read_text(encoding="utf-8")
+            # Keep recently used entries when evicting.
+            os.utime(path)
+            record(0)
+            return result
+        except OSError:
+            pass
+        flag.raised = False
+        result = highlight_block(source, lang, opts, force, location, **kwargs)
+        record(1)
+        if not flag.raised:
+            path.parent.mkdir(exist_ok=True)
+            temp_path = path.with_suffix(f".{os.getpid()}.tmp")
+            temp_path.write_text(result, encoding="utf-8")
+            os.replace(temp_path, path)
+        return result
+
+    highlighter.highlight_block = cached
+
+def record(index : int):
+    """Count a hit (0) or a miss (1)."""
+    with STATS.get_lock():
+        STATS[index] += 1
+
+def modification_times(paths) -> list[tuple[float, Path]]:
+    """Return (mtime, path) of the paths that still exist.
+
+    Builds of other locales share the directory and may replace or evict a
+    file at any time.
+    """
+    result = []
+    for path in paths:
+        try:
+            result.append((path.stat().st_mtime, path))
+        except FileNotFoundError:
+            pass
+    return result
+
+def report(app : Sphinx, exception):
+    if getattr(app.builder, "highlighter", None) is None or exception is not None:
+        return
+    directory = cache_dir(app)
+    hits, misses = STATS
+    total = hits + misses
+    # Entries are named by their key alone; files with a suffix are writes in flight.
+    entries = modification_times(path for path in directory.glob("??/*") if not path.suffix)
+    entries.sort(reverse=True)
+    for _mtime, path in entries[app.config.moonbit_highlight_cache_size:]:
+        path.unlink(missing_ok=True)
+    # Leftovers of interrupted writes.
+    now = time.time()
+    for mtime, path in modification_times(directory.glob("??/*.tmp")):
+        if now - mtime > 3600:
+            path.unlink(missing_ok=True)
+    # Hit logs of older versions of this extension.
+    for path in directory.glob("stats-*.log"):
+        path.unlink(missing_ok=True)
+    rate = f"{100 * hits / total:.1f}%" if total else "n/a"
+    logger.info(f"highlight cache: {hits} hits, {total - hits} misses ({rate} hit rate), {min(len(entries), app.config.moonbit_highlight_cache_size)} entries")
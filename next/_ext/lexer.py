@@ -1,3 +1,4 @@
+import re
 from pygments.lexer import RegexLexer, words, include, bygroups
 import pygments.token as token
 from sphinx.application import Sphinx
@@ -12,7 +13,170 @@ def setup(app: Sphinx) -> ExtensionMetadata:
         "parallel_write_safe": True,
     }
 
-class MoonBitLexer(RegexLexer):
+try:
+    from re import _parser as sre_parse
+except ImportError:  # Python < 3.11
+    import sre_parse
+
+CATEGORIES = {
+    "CATEGORY_DIGIT": re.compile(r"\d"),
+    "CATEGORY_NOT_DIGIT": re.compile(r"\D"),
+    "CATEGORY_SPACE": re.compile(r"\s"),
+    "CATEGORY_NOT_SPACE": re.compile(r"\S"),
+    "CATEGORY_WORD": re.compile(r"\w"),
+    "CATEGORY_NOT_WORD": re.compile(r"\W"),
+}
+
+def any_char(_c):
+    return True
+
+def first_chars(items, flags):
+    """Return predicates for the characters a parsed regex can start with, and
+    whether it can match the empty string.
+
+    Unknown constructs conservatively accept any character, and zero-width
+    assertions are skipped, so the predicates may over-approximate but never
+    miss a possible match.
+    """
+    predicates = []
+    for op, av in items:
+        name = str(op)
+        nullable = False
+        if name == "LITERAL":
+            if flags & re.IGNORECASE:
+                predicates.append(any_char)
+            else:
+                predicates.append(lambda c, literal=chr(av): c == literal)
+        elif name == "NOT_LITERAL":
+            predicates.append(lambda c, literal=chr(av): c != literal)
+        elif name == "ANY":
+            predicates.append(any_char if flags & re.DOTALL else lambda c: c != "\n")
+        elif name == "IN":
+            predicates.append(in_predicate(av, flags))
+        elif name in ("SUBPATTERN", "ATOMIC_GROUP"):
+            sub = av[-1] if name == "SUBPATTERN" else av
+            sub_flags = (flags | av[1]) & ~av[2] if name == "SUBPATTERN" else flags
+            sub_predicates, nullable = first_chars(sub, sub_flags)
+            predicates.extend(sub_predicates)
+        elif name == "BRANCH":
+            for branch in av[1]:
+                branch_predicates, branch_nullable = first_chars(branch, flags)
+                predicates.extend(branch_predicates)
+                nullable = nullable or branch_nullable
+        elif name in ("MAX_REPEAT", "MIN_REPEAT", "POSSESSIVE_REPEAT"):
+            minimum, _maximum, sub = av
+            sub_predicates, nullable = first_chars(sub, flags)
+            predicates.extend(sub_predicates)
+            nullable = nullable or minimum == 0
+        elif name in ("AT", "ASSERT", "ASSERT_NOT"):
+            nullable = True
+        else:
+            predicates.append(any_char)
+        if not nullable:
+            return predicates, False
+    return predicates, True
+
+def in_predicate(items, flags):
+    """Return a predicate for a character class."""
+    if flags & re.IGNORECASE:
+        return any_char
+    negate = False
+    tests = []
+    for op, av in items:
+        name = str(op)
+        if name == "NEGATE":
+            negate = True
+        elif name == "LITERAL":
+            tests.append(lambda c, literal=chr(av): c == literal)
+        elif name == "RANGE":
+            tests.append(lambda c, low=chr(av[0]), high=chr(av[1]): low <= c <= high)
+        elif name == "CATEGORY" and str(av) in CATEGORIES:
+            tests.append(lambda c, category=CATEGORIES[str(av)]: category.match(c) is not None)
+        else:
+            return any_char
+    if negate:
+        return lambda c: not any(test(c) for test in tests)
+    return lambda c: any(test(c) for test in tests)
+
+class DispatchRegexLexer(RegexLexer):
+    """A RegexLexer that only tries the rules able to match the next character.
+
+    For every state and character, the rules whose regex can start with that
+    character are computed once from the parsed regex and tried in their
+    original order, so the token stream is the same as RegexLexer's.
+    """
+
+    def rules_for(self, state, c):
+        dispatch = self.__class__.__dict__.get("_dispatch")
+        if dispatch is None:
+            dispatch = self.__class__._dispatch = {}
+        table = dispatch.get(state)
+        if table is None:
+            table = dispatch[state] = {}
+            table[None] = [
+                (rule, *first_chars(sre_parse.parse(rule[0].__self__.pattern, rule[0].__self__.flags), rule[0].__self__.flags))
+                for rule in self._tokens[state]
+            ]
+        rules = table.get(c)
+        if rules is None:
+            rules = table[c] = [
+                rule for rule, predicates, nullable in table[None]
+                if nullable or (c != "" and any(predicate(c) for predicate in predicates))
+            ]
+        return rules
+
+    def get_tokens_unprocessed(self, text, stack=('root',)):
+        # Mirrors RegexLexer.get_tokens_unprocessed, with the rule lookup
+        # narrowed by the character at the current position.
+        pos = 0
+        statestack = list(stack)
+        length = len(text)
+        while 1:
+            for rexmatch, action, new_state in self.rules_for(statestack[-1], text[pos] if pos < length else ""):
+                m = rexmatch(text, pos)
+                if m:
+                    if action is not None:
+                        if type(action) is token._TokenType:
+                            yield pos, action, m.group()
+                        else:
+                            yield from action(self, m)
+                    pos = m.end()
+                    if new_state is not None:
+                        # state transition
+                        if isinstance(new_state, tuple):
+                            for state in new_state:
+                                if state == '#pop':
+                                    if len(statestack) > 1:
+                                        statestack.pop()
+                                elif state == '#push':
+                                    statestack.append(statestack[-1])
+                                else:
+                                    statestack.append(state)
+                        elif isinstance(new_state, int):
+                            # pop, but keep at least one state on the stack
+                            if abs(new_state) >= len(statestack):
+                                del statestack[1:]
+                            else:
+                                del statestack[new_state:]
+                        elif new_state == '#push':
+                            statestack.append(statestack[-1])
+                        else:
+                            assert False, f"wrong state def: {new_state!r}"
+                    break
+            else:
+                # No rule matched
+                if pos >= length:
+                    break
+                if text[pos] == '\n':
+                    # at EOL, reset state to "root"
+                    statestack = ['root']
+                    yield pos, token.Whitespace, '\n'
+                    pos += 1
+                    continue
+                yield pos, token.Error, text[pos]
+                pos += 1
+
+class MoonBitLexer(DispatchRegexLexer):
     name = "MoonBit"
 
     tokens = {
@@ -0,0 +1,114 @@
+"""Shared runner for the moon and moonc processes spawned by the docs tooling.
+
+moonc has no resident server mode, so requests run as short-lived processes on
+a bounded pool. Work is submitted asynchronously and collected through futures;
+at most ``jobs`` toolchain processes are alive at any time.
+
+The executables are taken from the ``MOON`` and ``MOONC`` environment
+variables when set, so the service can be exercised with stub compilers.
+``MOONBIT_JOBS`` sets the default number of jobs, so that concurrent builds
+can share the machine.
+"""
+
+import json
+import os
+import shutil
+import subprocess
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+TOOLS = {
+    "moon": "MOON",
+    "moonc": "MOONC",
+}
+
+
+class CheckService:
+    def __init__(self, jobs: int | None = None):
+        self.jobs = jobs or int(os.getenv("MOONBIT_JOBS") or 0) or os.cpu_count() or 1
+        self.spawns = 0
+        self.lock = threading.Lock()
+        self.slots = threading.BoundedSemaphore(self.jobs)
+        self.pid = None
+        self.executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_exc):
+        self.close()
+
+    def close(self):
+        if self.executor is not None and self.pid == os.getpid():
+            self.executor.shutdown()
+        self.executor = None
+
+    def command(self, args: list[str]) -> list[str]:
+        """Resolve the executable of a toolchain command."""
+        tool = args[0]
+        if tool in TOOLS:
+            return [os.getenv(TOOLS[tool], tool), *args[1:]]
+        return list(args)
+
+    def run(self, args: list[str], **kwargs) -> subprocess.CompletedProcess:
+        """Run a toolchain command in the calling thread once a slot is free."""
+        kwargs.setdefault("capture_output", True)
+        kwargs.setdefault("text", True)
+        with self.slots:
+            with self.lock:
+                self.spawns += 1
+            return subprocess.run(self.command(args), **kwargs)
+
+    def submit(self, fn, *args, **kwargs) -> Future:
+        """Run ``fn`` on the worker pool and return its future."""
+        # Worker threads do not survive a fork, e.g. a parallel Sphinx read,
+        # so each process lazily gets its own executor.
+        if self.executor is None or self.pid != os.getpid():
+            self.pid = os.getpid()
+            self.executor = ThreadPoolExecutor(max_workers=self.jobs)
+        return self.executor.submit(fn, *args, **kwargs)
+
+    def submit_run(self, args: list[str], **kwargs) -> Future:
+        """Run a toolchain command asynchronously."""
+        return self.submit(self.run, args, **kwargs)
+
+    def parse(self, paths: list[str]) -> Future:
+        """Parse MoonBit source files without type checking them."""
+        return self.submit_run(["moonc", "compile", "-stop-after-parsing", *paths])
+
+    def version(self, cache_path: str | os.PathLike | None = None) -> str:
+        """Return the moonc version string, or an empty string if it is missing.
+
+        With ``cache_path``, versions are remembered in that JSON file by the
+        path, modification time and size of the moonc binary, and moonc is
+        only run again when it changes.
+        """
+        binary = shutil.which(self.command(["moonc"])[0])
+        if binary is None:
+            return ""
+        binary = os.path.realpath(binary)
+        stat = os.stat(binary)
+        stamp = [stat.st_mtime_ns, stat.st_size]
+        cache = {}
+        if cache_path is not None:
+            try:
+                with open(cache_path, "r") as file:
+                    cache = json.load(file)
+            except (OSError, ValueError):
+                cache = {}
+            if binary in cache and cache[binary][:2] == stamp:
+                return cache[binary][2]
+        try:
+            result = self.run(["moonc", "-v"], check=True)
+        except (OSError, subprocess.CalledProcessError):
+            return ""
+        version = (result.stdout + result.stderr).strip()
+        if cache_path is not None and version:
+            cache[binary] = [*stamp, version]
+            os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+            # Concurrent builds may write the cache at the same time.
+            temp_path = f"{cache_path}.{os.getpid()}.tmp"
+            with open(temp_path, "w") as file:
+                json.dump(cache, file, indent=1)
+            os.replace(temp_path, cache_path)
+        return version
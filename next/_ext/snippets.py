@@ -0,0 +1,201 @@
+"""Serve ``literalinclude`` from an index of the example sources.
+
+Every file under ``sources`` and ``snippets`` is read once when the builder
+starts. Each file keeps its lines, the positions of its ``// start <name>`` /
+``// end <name>`` markers with their byte ranges, and a memo of the lines
+matching each ``start-after``/``end-before`` pattern, so directives including
+the same file do not read or scan it again. Entries are refreshed when the
+file's mtime or size changes and rebuilt only when its hash changes too.
+
+The directive results are identical to Sphinx's reader. As a by-product, the
+build reports markers that no directive refers to and directive patterns that
+are not found in their file.
+"""
+
+import hashlib
+import os
+import re
+from pathlib import Path
+from sphinx.application import Sphinx
+from sphinx.directives import code
+from sphinx.environment import BuildEnvironment
+from sphinx.util.typing import ExtensionMetadata
+from sphinx.util import logging
+
+logger = logging.getLogger(__name__)
+
+SOURCE_DIRS = ["sources", "snippets"]
+IGNORED_DIRS = {"target", "_build", ".mooncakes"}
+MARKER = re.compile(r"//\s*((start|end)\s+(.*?))\s*$")
+ENCODINGS = {"utf-8", "utf-8-sig"}
+
+class Entry:
+    """An indexed source file."""
+    def __init__(self, path : str, stat : os.stat_result, data : bytes):
+        self.path = path
+        self.mtime = stat.st_mtime_ns
+        self.size = stat.st_size
+        self.hash = hashlib.sha256(data).hexdigest()
+        self.lines = data.decode("utf-8-sig").splitlines(True)
+        # (name, line of the start marker, byte range between the markers)
+        self.regions : list[tuple[str, int, tuple[int, int]]] = []
+        # pattern -> lines containing it
+        self.matches : dict[str, list[int]] = {}
+        starts = {}
+        offset = 0
+        for lineno, line in enumerate(self.lines):
+            end = offset + len(line.encode("utf-8"))
+            marker = MARKER.search(line)
+            if marker is not None:
+                kind, name = marker.group(2), marker.group(3)
+                if kind == "start":
+                    starts[name] = (lineno, end)
+                elif name in starts:
+                    start_line, start = starts.pop(name)
+                    self.regions.append((name, start_line, (start, offset)))
+            offset = end
+
+    def find(self, pattern : str) -> list[int]:
+        """Return the lines containing pattern, scanning the file once per pattern."""
+        if pattern not in self.matches:
+            self.matches[pattern] = [lineno for lineno, line in enumerate(self.lines) if pattern in line]
+        return self.matches[pattern]
+
+# Absolute path -> Entry
+INDEX : dict[str, Entry] = {}
+# Environment of the current build; readers only get the config.
+ENV : BuildEnvironment | None = None
+
+def setup(app: Sphinx) -> ExtensionMetadata:
+    app.connect("builder-inited", build_index)
+    app.connect("env-before-read-docs", reset_usage)
+    app.connect("env-purge-doc", purge_usage)
+    app.connect("env-merge-info", merge_usage)
+    app.connect("env-check-consistency", report)
+    code.LiteralIncludeReader = IndexedReader
+    return {
+        "version": "0.1.0",
+        "parallel_read_safe": True,
+        "parallel_write_safe": True,
+    }
+
+def build_index(app : Sphinx):
+    for directory in SOURCE_DIRS:
+        for root, dirs, files in os.walk(Path(app.srcdir) / directory):
+            dirs[:] = [d for d in dirs if d not in IGNORED_DIRS]
+            for name in files:
+                lookup(os.path.join(root, name))
+
+def lookup(path : str) -> Entry | None:
+    """Return the up-to-date entry of a file, or None if it cannot be indexed."""
+    path = os.path.abspath(path)
+    try:
+        stat = os.stat(path)
+        entry = INDEX.get(path)
+        if entry is not None and entry.mtime == stat.st_mtime_ns and entry.size == stat.st_size:
+            return entry
+        data = Path(path).read_bytes()
+        if entry is not None and entry.hash == hashlib.sha256(data).hexdigest():
+            entry.mtime, entry.size = stat.st_mtime_ns, stat.st_size
+            return entry
+        INDEX[path] = Entry(path, stat, data)
+    except (OSError, UnicodeError):
+        INDEX.pop(path, None)
+        return None
+    return INDEX[path]
+
+class IndexedReader(code.LiteralIncludeReader):
+    """LiteralIncludeReader answering start/end patterns from the index."""
+    def read_file(self, filename, location=None):
+        if self.encoding.lower() in ENCODINGS and "tab-width" not in self.options:
+            entry = lookup(filename)
+            if entry is not None:
+                self.entry, self.offset = entry, 0
+                # prepend and append modify the list in place, so hand out a copy.
+                return list(entry.lines)
+        self.entry = None
+        return super().read_file(filename, location)
+
+    def indexed(self):
+        return getattr(self, "entry", None) is not None and "pyobject" not in self.options
+
+    def start_filter(self, lines, location=None):
+        if "start-at" in self.options:
+            start, inclusive = self.options.get("start-at"), False
+        elif "start-after" in self.options:
+            start, inclusive = self.options.get("start-after"), True
+        else:
+            start = None
+        if not start or not self.indexed() or self.offset != 0:
+            return super().start_filter(lines, location)
+        matches = self.entry.find(start)
+        record_usage(self, start, matches[:1])
+        if not matches:
+            return super().start_filter(lines, location)
+        lineno = matches[0]
+        skip = lineno + 1 if inclusive else lineno
+        if "lineno-match" in self.options:
+            self.lineno_start += skip
+        self.offset = skip
+        return lines[skip:]
+
+    def end_filter(self, lines, location=None):
+        if "end-at" in self.options:
+            end, inclusive = self.options.get("end-at"), True
+        elif "end-before" in self.options:
+            end, inclusive = self.options.get("end-before"), False
+        else:
+            end = None
+        if not end or not self.indexed():
+            return super().end_filter(lines, location)
+        # Sphinx ignores an end-before match on the first remaining line.
+        first = self.offset if inclusive else self.offset + 1
+        matches = [lineno for lineno in self.entry.find(end) if lineno >= first]
+        record_usage(self, end, matches[:1])
+        if not matches:
+            return super().end_filter(lines, location)
+        lineno = matches[0] - self.offset
+        return lines[:lineno + 1] if inclusive else lines[:lineno]
+
+def record_usage(reader : IndexedReader, pattern : str, matches : list[int]):
+    docname = ENV.temp_data.get("docname") if ENV is not None else None
+    if docname is None:
+        return
+    usage = ENV.moonbit_snippet_usage.setdefault(docname, [])
+    usage.append((reader.entry.path, pattern, matches[0] if matches else None))
+
+def reset_usage(_app : Sphinx, env : BuildEnvironment, _docnames):
+    global ENV
+    ENV = env
+    if not hasattr(env, "moonbit_snippet_usage"):
+        env.moonbit_snippet_usage = {}
+
+def purge_usage(_app : Sphinx, env : BuildEnvironment, docname : str):
+    if hasattr(env, "moonbit_snippet_usage"):
+        env.moonbit_snippet_usage.pop(docname, None)
+
+def merge_usage(_app : Sphinx, env : BuildEnvironment, docnames, other : BuildEnvironment):
+    for docname in docnames:
+        if docname in other.moonbit_snippet_usage:
+            env.moonbit_snippet_usage[docname] = other.moonbit_snippet_usage[docname]
+
+def report(app : Sphinx, env : BuildEnvironment):
+    used = set()
+    dangling = []
+    for docname, usage in sorted(env.moonbit_snippet_usage.items()):
+        for path, pattern, lineno in usage:
+            if lineno is None:
+                dangling.append((docname, path, pattern))
+            else:
+                used.add((path, lineno))
+    unused = [
+        (path, name)
+        for path, entry in sorted(INDEX.items())
+        for name, lineno, _range in entry.regions
+        if (path, lineno) not in used
+    ]
+    for docname, path, pattern in dangling:
+        logger.info(f"dangling snippet marker in {docname}: {pattern!r} not found in {os.path.relpath(path, app.srcdir)}")
+    for path, name in unused:
+        logger.info(f"unused snippet marker: {os.path.relpath(path, app.srcdir)}: start {name}")
+    logger.info(f"snippet index: {len(INDEX)} files, {len(dangling)} dangling and {len(unused)} unused markers")
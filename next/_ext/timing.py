@@ -0,0 +1,195 @@
+"""Build profiling for the docs.
+
+Enable with ``-D moonbit_timing=1`` (for example ``make html O="-D
+moonbit_timing=1"``). Every document records its read time (MyST parsing and
+code checks), write time (translation and highlighting) and search indexing
+time, together with the number of moonc processes and MoonBit lexer tokens.
+At the end of the build, a JSON and a CSV report are written to
+``moonbit_timing_dir`` and the slowest pages are printed.
+
+Records are appended to an event log as they happen, so documents read or
+written by parallel worker processes are accounted for as well.
+"""
+
+import csv
+import json
+import os
+import sys
+import time
+from pathlib import Path
+from sphinx.application import Sphinx
+from sphinx.search import IndexBuilder
+from sphinx.util.typing import ExtensionMetadata
+from sphinx.util import logging
+
+logger = logging.getLogger(__name__)
+
+# Counters of the current process.
+LEXER = {"tokens": 0, "seconds": 0.0}
+SEARCH = {"seconds": 0.0}
+# Documents being read or written by the current process, with the counters
+# at the time they started.
+STARTED : dict[tuple[str, str], dict] = {}
+PHASES : dict[str, float] = {}
+
+def setup(app: Sphinx) -> ExtensionMetadata:
+    app.add_config_value("moonbit_timing", False, "")
+    app.add_config_value("moonbit_timing_dir", "_build/timing", "")
+    app.add_config_value("moonbit_timing_top", 10, "")
+    app.connect("builder-inited", start_build)
+    app.connect("env-before-read-docs", lambda app, _env, _docnames: mark(app, "read"))
+    app.connect("source-read", lambda app, docname, _source: start(app, "read", docname))
+    # Run after the other doctree-read handlers, such as the code check.
+    app.connect("doctree-read", lambda app, doctree: finish(app, "read", app.env.docname), priority=900)
+    app.connect("write-started", lambda app, _builder: mark(app, "write"))
+    app.connect("build-finished", write_report)
+    return {
+        "version": "0.1.0",
+        "parallel_read_safe": True,
+        "parallel_write_safe": True,
+    }
+
+def counters() -> dict:
+    check = sys.modules.get("check")
+    return {
+        "time": time.perf_counter(),
+        "moonc": check.SERVICE.spawns if check and hasattr(check, "SERVICE") else 0,
+        "tokens": LEXER["tokens"],
+        "lexer": LEXER["seconds"],
+        "search": SEARCH["seconds"],
+    }
+
+def events_path(app : Sphinx) -> Path:
+    return Path(app.confdir) / app.config.moonbit_timing_dir / "events.jsonl"
+
+def start_build(app : Sphinx):
+    if not app.config.moonbit_timing:
+        return
+    path = events_path(app)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text("")
+    PHASES["start"] = time.perf_counter()
+    wrap_lexer()
+    wrap_search()
+    wrap_builder(app)
+
+def wrap_lexer():
+    from lexer import MoonBitLexer
+    tokens_unprocessed = MoonBitLexer.get_tokens_unprocessed
+    def counted(self, *args, **kwargs):
+        # Only time the lexer itself, not the formatter consuming its tokens.
+        tokens = tokens_unprocessed(self, *args, **kwargs)
+        while True:
+            start = time.perf_counter()
+            item = next(tokens, None)
+            LEXER["seconds"] += time.perf_counter() - start
+            if item is None:
+                return
+            LEXER["tokens"] += 1
+            yield item
+    MoonBitLexer.get_tokens_unprocessed = counted
+
+def wrap_search():
+    feed = IndexBuilder.feed
+    def timed(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return feed(self, *args, **kwargs)
+        finally:
+            SEARCH["seconds"] += time.perf_counter() - start
+    IndexBuilder.feed = timed
+
+def wrap_builder(app : Sphinx):
+    # Page templates are rendered after html-page-context, so time the
+    # builder methods themselves rather than waiting for events.
+    for method in ("write_doc_serialized", "write_doc"):
+        write = getattr(app.builder, method)
+        def timed(docname, doctree, write=write):
+            start(app, "write", docname)
+            try:
+                return write(docname, doctree)
+            finally:
+                finish(app, "write", docname)
+        setattr(app.builder, method, timed)
+
+def mark(app : Sphinx, phase : str):
+    if app.config.moonbit_timing:
+        PHASES[phase] = time.perf_counter()
+
+def start(app : Sphinx, phase : str, docname : str):
+    if app.config.moonbit_timing:
+        STARTED[(phase, docname)] = counters()
+
+def finish(app : Sphinx, phase : str, docname : str):
+    if not app.config.moonbit_timing or (phase, docname) not in STARTED:
+        return
+    before = STARTED.pop((phase, docname))
+    after = counters()
+    search = after["search"] - before["search"]
+    record = {
+        "doc": docname,
+        "phase": phase,
+        "seconds": after["time"] - before["time"] - search,
+        "moonc": after["moonc"] - before["moonc"],
+        "tokens": after["tokens"] - before["tokens"],
+        "lexer": after["lexer"] - before["lexer"],
+    }
+    records = [record]
+    if search:
+        records.append({"doc": docname, "phase": "search", "seconds": search, "moonc": 0, "tokens": 0, "lexer": 0})
+    # One write per page keeps lines from parallel workers intact.
+    with open(events_path(app), "a") as events:
+        events.write("".join(json.dumps(record) + "\n" for record in records))
+
+def write_report(app : Sphinx, exception):
+    if not app.config.moonbit_timing or exception is not None:
+        return
+    for phase, docname in list(STARTED):
+        finish(app, phase, docname)
+    end = time.perf_counter()
+    pages : dict[str, dict] = {}
+    for line in events_path(app).read_text().splitlines():
+        record = json.loads(line)
+        page = pages.setdefault(record["doc"], {
+            "doc": record["doc"], "read": 0.0, "write": 0.0, "search": 0.0,
+            "moonc": 0, "tokens": 0, "lexer": 0.0,
+        })
+        page[record["phase"]] += record["seconds"]
+        for key in ("moonc", "tokens", "lexer"):
+            page[key] += record[key]
+    for page in pages.values():
+        page["total"] = page["read"] + page["write"] + page["search"]
+        for key in ("total", "read", "write", "search", "lexer"):
+            page[key] = round(page[key], 4)
+    rows = sorted(pages.values(), key=lambda page: page["total"], reverse=True)
+
+    marks = [("setup", PHASES.get("start")), ("read", PHASES.get("read")), ("write", PHASES.get("write")), ("finish", end)]
+    marks = [(name, mark) for name, mark in marks if mark is not None]
+    phases = {name: round(next_mark - mark, 3) for (name, mark), (_, next_mark) in zip(marks, marks[1:])}
+    tokens = sum(page["tokens"] for page in rows)
+    lexer = sum(page["lexer"] for page in rows)
+    report = {
+        "builder": app.builder.name,
+        "language": app.config.language,
+        "total": round(end - PHASES["start"], 3),
+        "phases": phases,
+        "moonc_spawns": sum(page["moonc"] for page in rows),
+        "lexer_tokens": tokens,
+        "lexer_seconds": round(lexer, 3),
+        "lexer_tokens_per_second": round(tokens / lexer) if lexer else 0,
+        "search_seconds": round(sum(page["search"] for page in rows), 3),
+        "pages": rows,
+    }
+    directory = events_path(app).parent
+    (directory / "report.json").write_text(json.dumps(report, indent=2) + "\n")
+    with open(directory / "report.csv", "w", newline="") as file:
+        writer = csv.DictWriter(file, fieldnames=["doc", "total", "read", "write", "search", "moonc", "tokens", "lexer"])
+        writer.writeheader()
+        writer.writerows(rows)
+    os.remove(events_path(app))
+
+    logger.info(f"build time: {report['total']}s ({', '.join(f'{name} {seconds}s' for name, seconds in phases.items())})")
+    logger.info(f"moonc spawns: {report['moonc_spawns']}, lexer: {tokens} tokens in {lexer:.3f}s, search indexing: {report['search_seconds']}s")
+    logger.info(f"slowest pages (report in {directory}):")
+    for page in rows[:app.config.moonbit_timing_top]:
+        logger.info(f"  {page['total']:8.3f}s  {page['doc']} (read {page['read']:.3f}s, write {page['write']:.3f}s)")
@@ -0,0 +1,26 @@
+"""Batches of file changes for the watch modes of the example checkers.
+
+Editors often save a file in several steps, and formatters rewrite files right
+after a save, so changes are collected until none has arrived for ``step``
+milliseconds, but for at most ``debounce`` milliseconds. Build outputs are
+ignored, otherwise every check would trigger the next one. Changes that arrive
+while a batch is being checked are kept for the next batch.
+
+watchfiles is only imported when watching, so the checkers run without it.
+"""
+
+from collections.abc import Iterator
+from pathlib import Path
+
+# Written by moon and the docs build, never inputs of an example.
+IGNORED_DIRS = {"target", ".mooncakes", "_build"}
+DEBOUNCE = 400
+STEP = 50
+
+def changes(*paths : Path, debounce : int = DEBOUNCE, step : int = STEP) -> Iterator[set[Path]]:
+    """Yield the sets of files changed under paths."""
+    from watchfiles import DefaultFilter, watch
+
+    watch_filter = DefaultFilter(ignore_dirs=(*DefaultFilter.ignore_dirs, *IGNORED_DIRS))
+    for batch in watch(*paths, watch_filter=watch_filter, debounce=debounce, step=step):
+        yield {Path(path) for _change, path in batch}
@@ -0,0 +1,35 @@
+"""Keep jieba's prefix dictionary for the Chinese search index.
+
+jieba, which splits Chinese words for the search index, builds its prefix
+dictionary the first time it is used and caches it in the system temporary
+directory. The cache is kept in ``moonbit_cache_dir`` instead, per jieba
+version, so that it survives where the temporary directory does not, such as
+between CI runs. jieba is only imported by Chinese builds that write a
+search index.
+"""
+
+from pathlib import Path
+from sphinx.application import Sphinx
+from sphinx.util.typing import ExtensionMetadata
+
+def setup(app: Sphinx) -> ExtensionMetadata:
+    if "moonbit_cache_dir" not in app.config:
+        app.add_config_value("moonbit_cache_dir", "_build/cache", "env")
+    app.connect("builder-inited", configure_jieba)
+    return {
+        "version": "0.1.0",
+        "parallel_read_safe": True,
+        "parallel_write_safe": True,
+    }
+
+def configure_jieba(app: Sphinx):
+    if not (app.config.language or "").startswith("zh") or app.builder.format != "html":
+        return
+    try:
+        import jieba
+    except ImportError:
+        return
+    cache_dir = Path(app.confdir) / app.config.moonbit_cache_dir
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    jieba.dt.tmp_dir = str(cache_dir)
+    jieba.dt.cache_file = f"jieba-{jieba.__version__}.cache"
@@ -0,0 +1,148 @@
+"""Build the docs for every locale at once.
+
+Each locale is built by its own sphinx-build process, with ``LANGUAGE`` set
+as for ``just docs-html-zh``, into ``_build/<language>/<builder>`` with its
+doctrees in ``_build/<language>/doctrees``. The builds run concurrently and
+split the cores between them.
+
+Work that does not depend on the locale is shared through
+``moonbit_cache_dir``: code check results and highlighted code blocks. The
+page dependency graph records what one environment has seen, so it is kept
+with the doctrees of each locale. Translations are applied while pages are
+read, so every locale still reads its own pages. When the code check cache is empty,
+concurrent builds would each check the same code blocks, so the English site
+is built first (the warm-up) and the other locales then find their checks in
+the cache.
+
+    python build_locales.py
+    python build_locales.py -l en -l ja -b dirhtml --warmup never
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent
+BUILD_DIR = BASE_DIR / "_build"
+# Written by the check extension in moonbit_cache_dir.
+CHECK_CACHE = BUILD_DIR / "cache" / "check.json"
+LANGUAGES = ["en", "zh_CN", "ja"]
+# Variables that make conf.py build a translated site.
+LANGUAGE_VARIABLES = ["LANGUAGE", "READTHEDOCS_LANGUAGE"]
+
+
+def build_env(language, jobs):
+    env = {
+        name: value for name, value in os.environ.items()
+        if name not in LANGUAGE_VARIABLES
+    }
+    if language != "en":
+        env["LANGUAGE"] = language
+    env["MOONBIT_JOBS"] = str(jobs)
+    return env
+
+
+def sphinx_build(language, builder, jobs, options):
+    """Return the sphinx-build command line of a locale."""
+    return [
+        sys.executable, "-m", "sphinx", "-b", builder, "-j", str(jobs),
+        "-d", str(BUILD_DIR / language / "doctrees"),
+        ".", str(BUILD_DIR / language / builder), *options,
+    ]
+
+
+def start(language, builder, jobs, options):
+    """Start the build of a locale, logging to _build/<language>/<builder>.log."""
+    log_path = BUILD_DIR / language / f"{builder}.log"
+    log_path.parent.mkdir(parents=True, exist_ok=True)
+    log = open(log_path, "w")
+    process = subprocess.Popen(
+        sphinx_build(language, builder, jobs, options),
+        cwd=BASE_DIR,
+        env=build_env(language, jobs),
+        stdout=log,
+        stderr=subprocess.STDOUT,
+    )
+    return process, log, log_path
+
+
+def report_failure(language, log_path):
+    print(f"FAIL: {language} (log in {log_path.relative_to(BASE_DIR)})")
+    lines = log_path.read_text().splitlines()
+    for line in lines[-20:]:
+        print(f"  {line}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the docs for every locale concurrently")
+    parser.add_argument(
+        "-l", "--language",
+        action="append",
+        choices=LANGUAGES,
+        help=f"locale to build, may be repeated (default: {', '.join(LANGUAGES)})")
+    parser.add_argument(
+        "-b", "--builder",
+        default="html",
+        help="Sphinx builder (default: html)")
+    parser.add_argument(
+        "-j", "--jobs",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="cores shared by all builds (default: all cores)")
+    parser.add_argument(
+        "--warmup",
+        choices=["auto", "always", "never"],
+        default="auto",
+        help="build en before the other locales: always, never, or when the "
+             "code check cache is empty (default: auto)")
+    parser.add_argument(
+        "options",
+        nargs=argparse.REMAINDER,
+        help="extra sphinx-build options, after --")
+    args = parser.parse_args()
+
+    languages = args.language or LANGUAGES
+    options = [option for option in args.options if option != "--"]
+    total_start = time.perf_counter()
+    times = {}
+
+    warmup = args.warmup == "always" or (args.warmup == "auto" and not CHECK_CACHE.exists())
+    if warmup and "en" in languages and len(languages) > 1:
+        print("Building en first to fill the caches", flush=True)
+        start_time = time.perf_counter()
+        process, log, log_path = start("en", args.builder, args.jobs, options)
+        process.wait()
+        log.close()
+        times["en"] = time.perf_counter() - start_time
+        if process.returncode != 0:
+            report_failure("en", log_path)
+            return process.returncode
+        languages = [language for language in languages if language != "en"]
+
+    jobs = max(1, args.jobs // len(languages))
+    builds = {}
+    for language in languages:
+        print(f"Building {language}", flush=True)
+        builds[language] = (time.perf_counter(), *start(language, args.builder, jobs, options))
+
+    failed = []
+    for language, (start_time, process, log, log_path) in builds.items():
+        process.wait()
+        log.close()
+        times[language] = time.perf_counter() - start_time
+        if process.returncode != 0:
+            report_failure(language, log_path)
+            failed.append(language)
+
+    total = time.perf_counter() - total_start
+    print(f"\nTotal {total:.2f}s")
+    for name, seconds in times.items():
+        print(f"  {name:8} {seconds:8.2f}s  {(BUILD_DIR / name / args.builder).relative_to(BASE_DIR)}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,374 @@
+"""Build the PDF book chapter by chapter.
+
+``make latexpdf`` compiles the whole book as one LaTeX job, from scratch. This
+script writes one LaTeX document per chapter instead, in a single Sphinx run,
+and compiles the chapters concurrently with latexmk. A chapter is only
+compiled again when its ``.tex``, the shared LaTeX support files or its first
+page number changed; otherwise the PDF of the previous build is reused.
+
+Pages are numbered as in the whole book: each chapter starts at the page
+after the last page of the previous chapter, as counted by the previous
+build, and the pages of the docs, which are LaTeX chapters, are numbered
+across chapters. When a chapter's page count changes, the chapters after it
+are compiled again with their new first page. The book is then assembled
+with pdfpages behind a title page and a table of contents collected from the
+chapters, linking to their pages.
+
+References between chapters are rendered as text, like the references
+between documents of ``latex_documents``, and the book has no index.
+
+    python build_pdf.py
+    python build_pdf.py -l zh_CN -j 4
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent
+PDF_DIR = BASE_DIR / "_build" / "pdf"
+# (name, root document) in book order. The error codes are left out of the
+# language chapter to get their own.
+CHAPTERS = [
+    ("tutorial", "tutorial/index"),
+    ("language", "language/index"),
+    ("toolchain", "toolchain/index"),
+    ("example", "example/index"),
+    ("error_codes", "language/error_codes/index"),
+]
+# Variables that make conf.py build a translated site.
+LANGUAGE_VARIABLES = ["LANGUAGE", "READTHEDOCS_LANGUAGE"]
+# Page counts may change with the first page, e.g. through blank pages before
+# chapters, so stop compiling again after a few rounds.
+MAX_ROUNDS = 3
+PAGES = re.compile(r"Output written on .*\((\d+) pages?")
+LATEX_CHAPTER = re.compile(r"^\\chapter\{", re.MULTILINE)
+CONTENTS_LINE = re.compile(r"^(\\contentsline\s*\{\w+\}\{.*\})\{(\d+)\}\{[^{}]*\}%?\s*$")
+
+# Chapters get no title page, table of contents or index, and start at the
+# LaTeX chapter and page numbers set by their wrapper. The table of contents file
+# is still written for the book.
+CHAPTER_ELEMENTS = {
+    "maketitle": "",
+    "makeindex": "",
+    "printindex": "",
+    "tableofcontents": r"""\makeatletter
+\if@filesw\newwrite\tf@toc\immediate\openout\tf@toc\jobname.toc\relax\fi
+\makeatother
+\pagenumbering{arabic}\setcounter{page}{\moonbitfirstpage}
+\setcounter{chapter}{\moonbitchapter}""",
+}
+
+BOOK = r"""\documentclass[{papersize}]{{report}}
+\usepackage{{pdfpages}}
+{cjk}\usepackage[hidelinks]{{hyperref}}
+\title{{{title}}}
+\author{{{author}}}
+\date{{{release}}}
+\begin{{document}}
+\pagenumbering{{roman}}
+\maketitle
+\chapter*{{\contentsname}}
+\input{{book-contents}}
+\clearpage
+\pagenumbering{{arabic}}
+{chapters}
+\end{{document}}
+"""
+
+
+def file_hash(path):
+    return hashlib.sha256(Path(path).read_bytes()).hexdigest()
+
+
+def set_language(language):
+    """Make conf.py, which reads the environment, configure a locale."""
+    for name in LANGUAGE_VARIABLES:
+        os.environ.pop(name, None)
+    if language != "en":
+        os.environ["LANGUAGE"] = language
+
+
+def write_latex(language, jobs, log):
+    """Write the LaTeX document of every chapter with one Sphinx run.
+
+    Returns the Sphinx configuration and the title of every chapter.
+    """
+    from sphinx.application import Sphinx
+    from sphinx.builders import latex
+    from sphinx.config import eval_config_file
+
+    set_language(language)
+    namespace = eval_config_file(str(BASE_DIR / "conf.py"), None)
+    elements = {**namespace.get("latex_elements", {}), **CHAPTER_ELEMENTS}
+    documents = [
+        (root, f"{name}.tex", name.replace("_", " ").title(), namespace.get("author", ""), "manual")
+        for name, root in CHAPTERS
+    ]
+    roots = [root for _name, root in CHAPTERS]
+    inline_all_toctrees = latex.inline_all_toctrees
+
+    def inline_chapter(builder, docnameset, docname, tree, colorfunc, traversed, indent=""):
+        # Documents already traversed are skipped, so mark the other
+        # chapters as such.
+        if not indent:
+            traversed.extend(root for root in roots if root not in traversed)
+        return inline_all_toctrees(builder, docnameset, docname, tree, colorfunc, traversed, indent)
+
+    latex.inline_all_toctrees = inline_chapter
+    try:
+        app = Sphinx(
+            BASE_DIR, BASE_DIR, PDF_DIR / language / "latex", PDF_DIR / language / "doctrees", "latex",
+            confoverrides={"latex_documents": documents, "latex_elements": elements},
+            status=log, warning=log, parallel=jobs,
+        )
+        app.build()
+    finally:
+        latex.inline_all_toctrees = inline_all_toctrees
+    if app.statuscode:
+        raise RuntimeError("sphinx-build failed")
+    return app.config, {name: app.env.titles[root].astext() for name, root in CHAPTERS}
+
+
+def support_hash(latex_dir):
+    """Return a hash of the files the chapters share, such as styles and images."""
+    chapters = {f"{name}.tex" for name, _root in CHAPTERS}
+    outputs = tuple(f"{name}-chapter." for name, _root in CHAPTERS)
+    digest = hashlib.sha256()
+    for path in sorted(latex_dir.rglob("*")):
+        if not path.is_file() or path.name in chapters or path.name.startswith(outputs):
+            continue
+        digest.update(f"{path.relative_to(latex_dir).as_posix()}\0{file_hash(path)}\0".encode())
+    return digest.hexdigest()
+
+
+def chapter_key(latex_dir, support, engine, name, chapters_before, first_page):
+    digest = hashlib.sha256(f"{support}\0{engine}\0{chapters_before}\0{first_page}\0".encode())
+    digest.update(file_hash(latex_dir / f"{name}.tex").encode())
+    return digest.hexdigest()
+
+
+def latexmk(engine):
+    if engine in ("platex", "uplatex"):
+        return ["latexmk", "-r", "latexmkjarc", "-pdfdvi", "-dvi-", "-ps-"]
+    return ["latexmk", "-pdf", "-dvi-", "-ps-"]
+
+
+def compile_chapter(latex_dir, engine, name, chapters_before, first_page):
+    """Compile a chapter through its wrapper, returning (passed, pages, seconds, log)."""
+    wrapper = latex_dir / f"{name}-chapter.tex"
+    wrapper.write_text(
+        f"\\def\\moonbitfirstpage{{{first_page}}}\n"
+        f"\\def\\moonbitchapter{{{chapters_before}}}\n"
+        f"\\input{{{name}.tex}}\n")
+    start = time.perf_counter()
+    result = subprocess.run(
+        [*latexmk(engine), "-interaction=nonstopmode", "-halt-on-error", wrapper.name],
+        cwd=latex_dir,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        text=True,
+        errors="replace",
+    )
+    seconds = time.perf_counter() - start
+    log_path = latex_dir / f"{name}-chapter.log"
+    log = log_path.read_text(errors="replace") if log_path.exists() else result.stdout
+    pages = PAGES.findall(log)
+    if result.returncode != 0 or not pages:
+        return False, 0, seconds, result.stdout
+    return True, int(pages[-1]), seconds, ""
+
+
+def contents(latex_dir, name, first_page):
+    """Return the table of contents lines of a chapter, linking to its pages in the book."""
+    toc_path = latex_dir / f"{name}-chapter.toc"
+    lines = []
+    for line in toc_path.read_text(errors="replace").splitlines() if toc_path.exists() else []:
+        match = CONTENTS_LINE.match(line)
+        if match:
+            page = int(match.group(2))
+            lines.append(f"{match.group(1)}{{{page}}}{{{name}.{page - first_page + 1}}}%")
+    return lines
+
+
+def assemble(language, config, titles, latex_dir, chapters, output):
+    """Assemble the chapter PDFs into the book, returning (passed, output)."""
+    from sphinx.util.texescape import escape
+
+    book_dir = PDF_DIR / language / "book"
+    book_dir.mkdir(parents=True, exist_ok=True)
+    lines = []
+    includes = []
+    for name, _root in CHAPTERS:
+        first_page = chapters[name]["first_page"]
+        lines.append(f"\\contentsline{{part}}{{{escape(titles[name])}}}{{{first_page}}}{{{name}.1}}%")
+        lines.extend(contents(latex_dir, name, chapters[name]["first_page"]))
+        shutil.copyfile(latex_dir / f"{name}-chapter.pdf", book_dir / f"{name}.pdf")
+        includes.append(f"\\includepdf[pages=-,link,linkname={name}]{{{name}.pdf}}")
+    (book_dir / "book-contents.tex").write_text("\n".join(lines) + "\n")
+    cjk = "\\usepackage{xeCJK}\n" if (config.language or "").startswith(("zh", "ja")) else ""
+    (book_dir / "book.tex").write_text(BOOK.format(
+        papersize=config.latex_elements.get("papersize", "letterpaper"),
+        cjk=cjk,
+        title=escape(config.project),
+        author=escape(config.author),
+        release=escape(config.release),
+        chapters="\n".join(includes),
+    ))
+    result = subprocess.run(
+        ["xelatex", "-interaction=nonstopmode", "-halt-on-error", "book.tex"],
+        cwd=book_dir,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        text=True,
+        errors="replace",
+    )
+    if result.returncode != 0:
+        return False, result.stdout
+    shutil.copyfile(book_dir / "book.pdf", output)
+    return True, ""
+
+
+def load_state(path):
+    try:
+        return json.loads(path.read_text())
+    except (OSError, ValueError):
+        return {"chapters": {}}
+
+
+def save_state(path, state):
+    temp_path = path.with_suffix(".tmp")
+    temp_path.write_text(json.dumps(state, indent=1, sort_keys=True) + "\n")
+    os.replace(temp_path, path)
+
+
+def report_failure(name, output):
+    print(f"FAIL: {name}")
+    for line in output.splitlines()[-20:]:
+        print(f"  {line}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the PDF book chapter by chapter")
+    parser.add_argument(
+        "-l", "--language",
+        default="en",
+        help="locale of the book (default: en)")
+    parser.add_argument(
+        "-j", "--jobs",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Sphinx processes and chapters compiled concurrently (default: all cores)")
+    parser.add_argument(
+        "-o", "--output",
+        help="path of the book (default: _build/pdf/<language>/moonbit.pdf)")
+    args = parser.parse_args()
+
+    missing = [tool for tool in ("latexmk", "xelatex") if shutil.which(tool) is None]
+    if missing:
+        print(f"Missing {', '.join(missing)}; install a TeX distribution to build the PDF")
+        return 1
+
+    language_dir = PDF_DIR / args.language
+    language_dir.mkdir(parents=True, exist_ok=True)
+    latex_dir = language_dir / "latex"
+    output = Path(args.output) if args.output else language_dir / "moonbit.pdf"
+    state_path = language_dir / "state.json"
+    state = load_state(state_path)
+    chapters = state["chapters"]
+    total_start = time.perf_counter()
+
+    print("Writing LaTeX", flush=True)
+    start = time.perf_counter()
+    log_path = language_dir / "sphinx.log"
+    with open(log_path, "w") as log:
+        try:
+            config, titles = write_latex(args.language, max(args.jobs, 1), log)
+        except Exception as error:
+            log.write(f"{error}\n")
+            failed = True
+        else:
+            failed = False
+    if failed:
+        report_failure("sphinx", log_path.read_text())
+        return 1
+    sphinx_time = time.perf_counter() - start
+
+    support = support_hash(latex_dir)
+    engine = config.latex_engine
+    chapters_before = {}
+    count = 0
+    for name, _root in CHAPTERS:
+        chapters_before[name] = count
+        count += len(LATEX_CHAPTER.findall((latex_dir / f"{name}.tex").read_text(errors="replace")))
+    compile_times = {}
+    for _round in range(MAX_ROUNDS):
+        first_pages = {}
+        page = 1
+        for name, _root in CHAPTERS:
+            first_pages[name] = page
+            page += chapters.get(name, {}).get("pages", 0)
+        keys = {
+            name: chapter_key(latex_dir, support, engine, name, chapters_before[name], first_pages[name])
+            for name, _root in CHAPTERS
+        }
+        stale = [
+            name for name, _root in CHAPTERS
+            if chapters.get(name, {}).get("key") != keys[name]
+            or not (latex_dir / f"{name}-chapter.pdf").exists()
+        ]
+        if not stale:
+            break
+        for name in stale:
+            print(f"Compiling {name} from page {first_pages[name]}", flush=True)
+        with ThreadPoolExecutor(max_workers=max(args.jobs, 1)) as executor:
+            futures = [
+                (name, executor.submit(
+                    compile_chapter, latex_dir, engine, name, chapters_before[name], first_pages[name]))
+                for name in stale
+            ]
+            for name, future in futures:
+                ok, pages, seconds, compile_output = future.result()
+                compile_times[name] = compile_times.get(name, 0.0) + seconds
+                if not ok:
+                    chapters.pop(name, None)
+                    save_state(state_path, state)
+                    report_failure(name, compile_output)
+                    return 1
+                chapters[name] = {"key": keys[name], "pages": pages, "first_page": first_pages[name]}
+        save_state(state_path, state)
+    else:
+        print(f"Warning: page numbers did not settle after {MAX_ROUNDS} rounds")
+
+    print("Assembling the book", flush=True)
+    start = time.perf_counter()
+    ok, assemble_output = assemble(args.language, config, titles, latex_dir, chapters, output)
+    if not ok:
+        report_failure("book", assemble_output)
+        return 1
+    assemble_time = time.perf_counter() - start
+
+    print(f"\nTotal {time.perf_counter() - total_start:.2f}s")
+    print(f"  {'sphinx':12} {sphinx_time:8.2f}s")
+    for name, _root in CHAPTERS:
+        chapter = chapters[name]
+        pages = f"pages {chapter['first_page']}-{chapter['first_page'] + chapter['pages'] - 1}"
+        if name in compile_times:
+            print(f"  {name:12} {compile_times[name]:8.2f}s  {pages}")
+        else:
+            print(f"  {name:12} {'reused':>9}  {pages}")
+    print(f"  {'assembly':12} {assemble_time:8.2f}s")
+    print(f"Written {os.path.relpath(output)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
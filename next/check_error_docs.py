@@ -2,12 +2,22 @@
 """Check error code documentation script"""
 
 import argparse
+import hashlib
+import json
 import os
-import subprocess
 import re
+import sys
+import tempfile
+import time
+import xml.etree.ElementTree as ET
 from pathlib import Path
 
 BASE_DIR = Path(__file__).resolve().parent
+sys.path.append(str(BASE_DIR / '_ext'))
+
+from moonc_service import CheckService  # noqa: E402
+import watcher  # noqa: E402
+
 ERROR_CODES_DIR = BASE_DIR / 'language/error_codes'
 ERROR_CODES_SOURCE_DIR = BASE_DIR / 'sources/error_codes'
 RUN_ONLY_ERROR_CODES = set()
@@ -46,6 +56,28 @@ SKIPPED_ERROR_CODES = {
     '4049',
 }
 MOONC_VERSION = None
+SERVICE = CheckService()
+# Shared with the Sphinx code check.
+TOOLCHAIN_CACHE_PATH = BASE_DIR / '_build' / 'cache' / 'toolchain.json'
+CACHE_PATH = BASE_DIR / '_build' / 'check_error_docs' / 'cache.json'
+CACHE_MAX_ENTRIES = 4096
+CACHE_MAX_AGE = 30 * 24 * 60 * 60
+# Build outputs and installed dependencies are not inputs of an example.
+CACHE_IGNORED_DIRS = {'target', '_build', '.mooncakes'}
+# Maps a cache key to {'passed': True, 'used': timestamp}, or None when the
+# cache is disabled. Failures are not cached: they may be transient, such as
+# a lock error of moon, and are checked again on the next run.
+RESULT_CACHE = None
+WORKSPACE_DIR = BASE_DIR / '_build' / 'check_error_docs'
+# Maps a project path to the record of its check: whether it passed, how it
+# was checked, its elapsed time and its diagnostics.
+EXAMPLE_RESULTS = {}
+# Whether moon check supports --output-json, probed on first use.
+JSON_OUTPUT = None
+DIAGNOSTIC_HEADER = re.compile(r'(Warning|Error): \[(\d{4})\] *(.*)')
+DIAGNOSTIC_LOCATION = re.compile(r'╭─\[\s*(.+?):(\d+):(\d+)\s*\]')
+MEMBER_PATH = re.compile(r'error_codes[/\\](\d{4}_(?:error|fixed))[/\\]')
+EXAMPLE_DIR = re.compile(r'(\d{4})_(?:error|fixed)')
 
 
 def example_status(error_code):
@@ -70,29 +102,86 @@ def is_moon_project(path: Path) -> bool:
     return (path / 'moon.mod.json').exists()
 
 
-def diagnostic_codes(output):
-    """Return all numbered compiler diagnostics in moon output."""
-    return re.findall(r'(?:Warning|Error): \[(\d{4})\]', output)
-
-
-def has_error_code(output, error_code):
-    """Return True if moon output contains this error diagnostic."""
-    return bool(re.search(rf'Error: \[{error_code}\]', output))
+def json_output():
+    """Return True if moon check can print diagnostics as JSON."""
+    global JSON_OUTPUT
+    if JSON_OUTPUT is None:
+        try:
+            result = SERVICE.run(['moon', 'check', '--help'])
+            JSON_OUTPUT = '--output-json' in result.stdout
+        except OSError:
+            JSON_OUTPUT = False
+    return JSON_OUTPUT
+
+
+def check_command():
+    """Return the moon check command line."""
+    if json_output():
+        return ['moon', 'check', '--output-json']
+    return ['moon', 'check']
+
+
+def parse_diagnostics(output):
+    """Return the numbered compiler diagnostics in moon output.
+
+    Each diagnostic is a dict with its code, severity, path, start and end
+    (line and column lists, or None when unknown) and message. JSON lines
+    from --output-json are used when present; otherwise the rendered text is
+    scanned.
+    """
+    diagnostics = []
+    for line in output.splitlines():
+        if not line.startswith('{'):
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            continue
+        if not isinstance(record, dict) or record.get('error_code') is None:
+            continue
+        location = record.get('loc') or {}
+        start = location.get('start') or {}
+        end = location.get('end') or {}
+        diagnostics.append({
+            'code': f"{int(record['error_code']):04d}",
+            'severity': str(record.get('level', '')).lower(),
+            'path': location.get('path'),
+            'start': [start['line'], start['col']] if start else None,
+            'end': [end['line'], end['col']] if end else None,
+            'message': record.get('message', ''),
+        })
+    if diagnostics:
+        return diagnostics
+
+    headers = list(DIAGNOSTIC_HEADER.finditer(output))
+    for header, next_header in zip(headers, headers[1:] + [None]):
+        body = output[header.end():next_header.start() if next_header else len(output)]
+        location = DIAGNOSTIC_LOCATION.search(body)
+        diagnostics.append({
+            'code': header.group(2),
+            'severity': header.group(1).lower(),
+            'path': location.group(1) if location else None,
+            'start': [int(location.group(2)), int(location.group(3))] if location else None,
+            'end': None,
+            'message': header.group(3),
+        })
+    return diagnostics
+
+
+def format_diagnostic(diagnostic):
+    """Return a one-line description of a diagnostic."""
+    location = Path(diagnostic['path']).name if diagnostic['path'] else '?'
+    if diagnostic['start']:
+        location += ':{}:{}'.format(*diagnostic['start'])
+    message = f" {diagnostic['message']}" if diagnostic['message'] else ''
+    return f"{diagnostic['severity']} [{diagnostic['code']}] {location}{message}"
 
 
 def moonc_version():
     """Return the active moonc version string, or an empty string on failure."""
     global MOONC_VERSION
     if MOONC_VERSION is None:
-        try:
-            result = subprocess.run(
-                ['moonc', '-v'],
-                capture_output=True,
-                text=True,
-            )
-            MOONC_VERSION = (result.stdout + result.stderr).strip()
-        except Exception:
-            MOONC_VERSION = ''
+        MOONC_VERSION = SERVICE.version(TOOLCHAIN_CACHE_PATH)
     return MOONC_VERSION
 
 
@@ -106,45 +195,256 @@ def allow_toolchain_drift(error_code):
     )
 
 
+def project_hash(path: Path) -> str:
+    """Return a hash of every input file in a Moon project."""
+    digest = hashlib.sha256()
+    for root, dirs, files in os.walk(path):
+        dirs[:] = sorted(
+            d for d in dirs
+            if d not in CACHE_IGNORED_DIRS and not d.startswith('.'))
+        for name in sorted(files):
+            file = Path(root) / name
+            digest.update(file.relative_to(path).as_posix().encode())
+            digest.update(b'\0')
+            digest.update(file.read_bytes())
+            digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def load_cache():
+    """Load the result cache from disk, dropping failures and entries that are too old."""
+    global RESULT_CACHE
+    try:
+        entries = json.loads(CACHE_PATH.read_text())
+    except (OSError, ValueError):
+        entries = {}
+    now = time.time()
+    RESULT_CACHE = {
+        key: entry for key, entry in entries.items()
+        if entry.get('passed') and now - entry.get('used', 0) <= CACHE_MAX_AGE
+    }
+
+
+def save_cache():
+    """Write the result cache to disk, keeping the most recently used entries."""
+    if RESULT_CACHE is None:
+        return
+    entries = sorted(
+        RESULT_CACHE.items(), key=lambda item: item[1]['used'], reverse=True)
+    CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = CACHE_PATH.with_suffix('.tmp')
+    temp_path.write_text(json.dumps(dict(entries[:CACHE_MAX_ENTRIES])))
+    os.replace(temp_path, CACHE_PATH)
+
+
+def cache_key(file_path, error_code):
+    """Return the cache key for checking a project, or None if uncacheable."""
+    if RESULT_CACHE is None or not moonc_version():
+        return None
+    return hashlib.sha256('\0'.join([
+        moonc_version(),
+        error_code or '',
+        project_hash(Path(file_path)),
+    ]).encode()).hexdigest()
+
+
+def expected_outcome(diagnostics, returncode, error_code=None):
+    """Return True if moon check diagnostics are what the example expects."""
+    codes = [diagnostic['code'] for diagnostic in diagnostics]
+
+    if error_code:
+        error_code_padded = error_code.zfill(4)
+        has_only_expected = codes and all(
+            code == error_code_padded for code in codes)
+        if int(error_code) < 3000:
+            # Expect warning or error
+            return bool(has_only_expected)
+        # Expect error - command should fail. Error recovery can report
+        # cascading diagnostics, so only warning-code examples are
+        # strict about emitting no other diagnostic codes.
+        return returncode != 0 and any(
+            diagnostic['code'] == error_code_padded
+            and diagnostic['severity'] == 'error'
+            for diagnostic in diagnostics)
+
+    # Expect no warnings or errors
+    return not codes and returncode == 0
+
+
 def run_moon_test(file_path, error_code=None):
     """Execute moon check command and return results"""
     try:
         if not is_moon_project(Path(file_path)):
             return True
-        subprocess.run(['moon', 'clean'], cwd=file_path)
-        result = subprocess.run(
-            ['moon', 'check'],
-            capture_output=True,
-            text=True,
+        if file_path in EXAMPLE_RESULTS:
+            return EXAMPLE_RESULTS[file_path]['passed']
+        start = time.perf_counter()
+        key = cache_key(file_path, error_code)
+        if key is not None and key in RESULT_CACHE:
+            entry = RESULT_CACHE[key]
+            entry['used'] = time.time()
+            record_example(
+                file_path, error_code, entry['passed'], 'cache',
+                time.perf_counter() - start, entry.get('diagnostics', []))
+            return entry['passed']
+        SERVICE.run(['moon', 'clean'], cwd=file_path)
+        result = SERVICE.run(
+            check_command(),
             env={**os.environ, 'NO_COLOR': '1'},
             cwd=file_path,
         )
 
-        output = result.stdout + result.stderr
-        codes = diagnostic_codes(output)
-
-        if error_code:
-            error_code_padded = error_code.zfill(4)
-            has_only_expected = codes and all(
-                code == error_code_padded for code in codes)
-            if int(error_code) < 3000:
-                # Expect warning or error
-                has_expected = has_only_expected
-            else:
-                # Expect error - command should fail. Error recovery can report
-                # cascading diagnostics, so only warning-code examples are
-                # strict about emitting no other diagnostic codes.
-                has_expected = result.returncode != 0 and \
-                    has_error_code(output, error_code_padded)
-        else:
-            # Expect no warnings or errors
-            has_expected = not codes and result.returncode == 0
-
+        diagnostics = parse_diagnostics(result.stdout + result.stderr)
+        has_expected = expected_outcome(
+            diagnostics, result.returncode, error_code)
+        record_example(
+            file_path, error_code, has_expected, 'isolated',
+            time.perf_counter() - start, diagnostics, key)
         return has_expected
 
-    except Exception:
+    except Exception as e:
+        record_example(file_path, error_code, False, 'isolated', 0, [], error=str(e))
+        return False
+
+
+def record_example(file_path, error_code, passed, source, elapsed,
+                   diagnostics, key=None, error=None):
+    """Remember the result of checking an example, and cache it under key if it passed."""
+    EXAMPLE_RESULTS[file_path] = {
+        'example': Path(file_path).name,
+        'expected': error_code,
+        'passed': passed,
+        'source': source,
+        'elapsed': round(elapsed, 3),
+        'diagnostics': diagnostics,
+    }
+    if error is not None:
+        EXAMPLE_RESULTS[file_path]['error'] = error
+    if key is not None and passed:
+        RESULT_CACHE[key] = {
+            'passed': passed, 'used': time.time(), 'diagnostics': diagnostics}
+
+
+def module_name(path):
+    """Return the module name of a Moon project, or None if unreadable."""
+    try:
+        return json.loads((Path(path) / 'moon.mod.json').read_text()).get('name')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def can_share_workspace(path, error_code):
+    """Return True if an example can be checked in a shared workspace.
+
+    A workspace check fails as a whole on any error, so only examples that
+    are expected to build are shared: fixed examples and warning examples.
+    Modules with dependencies, a preferred target or interface files keep
+    their own build.
+    """
+    if error_code is not None and int(error_code) >= 3000:
+        return False
+    try:
+        module = json.loads((Path(path) / 'moon.mod.json').read_text())
+    except (OSError, ValueError):
+        return False
+    return (
+        isinstance(module, dict) and set(module) == {'name'}
+        and not any(Path(path).rglob('*.mbti'))
+    )
+
+
+def example_checks(error_codes):
+    """Return the (project path, expected code) checks of error codes."""
+    checks = []
+    for error_code in error_codes:
+        if error_code in SKIPPED_ERROR_CODES:
+            continue
+        error_path = str(ERROR_CODES_SOURCE_DIR / f"{error_code}_error")
+        fixed_path = str(ERROR_CODES_SOURCE_DIR / f"{error_code}_fixed")
+        if error_code in RUN_ONLY_ERROR_CODES:
+            checks += [(error_path, None), (fixed_path, None)]
+        else:
+            checks += [(error_path, error_code), (fixed_path, None)]
+    return [
+        (path, error_code) for path, error_code in checks
+        if is_moon_project(Path(path))
+    ]
+
+
+def check_workspace(members):
+    """Check examples together in a temporary workspace.
+
+    Fills EXAMPLE_RESULTS and returns True, or returns False if the build
+    failed or a diagnostic cannot be attributed to one example, in which case
+    the examples are left to the isolated check.
+    """
+    WORKSPACE_DIR.mkdir(parents=True, exist_ok=True)
+    with tempfile.TemporaryDirectory(
+            prefix='workspace-', dir=WORKSPACE_DIR) as workspace:
+        lines = [
+            f'  "{Path(os.path.relpath(path, workspace)).as_posix()}",'
+            for path, _ in members
+        ]
+        (Path(workspace) / 'moon.work').write_text(
+            'members = [\n' + '\n'.join(lines) + '\n]\n')
+        start = time.perf_counter()
+        result = SERVICE.run(
+            check_command(),
+            env={**os.environ, 'NO_COLOR': '1'},
+            cwd=workspace,
+        )
+        elapsed = time.perf_counter() - start
+    if result.returncode != 0:
         return False
 
+    diagnostics = {Path(path).name: [] for path, _ in members}
+    for diagnostic in parse_diagnostics(result.stdout + result.stderr):
+        match = MEMBER_PATH.search(diagnostic['path'] or '')
+        if match is None or match.group(1) not in diagnostics:
+            return False
+        diagnostics[match.group(1)].append(diagnostic)
+
+    for path, error_code in members:
+        example_diagnostics = diagnostics[Path(path).name]
+        passed = expected_outcome(example_diagnostics, 0, error_code)
+        # The build is shared, so is its time.
+        record_example(
+            path, error_code, passed, 'workspace', elapsed / len(members),
+            example_diagnostics, cache_key(path, error_code))
+    return True
+
+
+def check_in_workspaces(error_codes):
+    """Check the examples of error codes that can share a build.
+
+    Module names must be unique within a workspace, so the examples are split
+    into as few workspaces as needed. Returns how many examples were checked
+    and in how many workspaces.
+    """
+    batches = []
+    for path, error_code in example_checks(error_codes):
+        key = cache_key(path, error_code)
+        if key is not None and key in RESULT_CACHE:
+            continue
+        if not can_share_workspace(path, error_code):
+            continue
+        name = module_name(path)
+        for batch in batches:
+            if name not in batch:
+                batch[name] = (path, error_code)
+                break
+        else:
+            batches.append({name: (path, error_code)})
+    futures = [
+        SERVICE.submit(check_workspace, list(batch.values()))
+        for batch in batches
+    ]
+    checked = [
+        len(batch) for batch, future in zip(batches, futures)
+        if future.result()
+    ]
+    return sum(checked), len(checked)
+
 
 def check_error_code(error_code):
     """Check specific error code documentation"""
@@ -171,6 +471,116 @@ def check_error_code(error_code):
     return error_ok and fixed_ok
 
 
+def timed_check_error_code(error_code):
+    """Check one error code and return (passed, elapsed seconds)."""
+    start = time.perf_counter()
+    passed = check_error_code(error_code)
+    return passed, time.perf_counter() - start
+
+
+def check_error_codes(error_codes, jobs):
+    """Check error codes concurrently, returning results in input order."""
+    # Warm the toolchain probes once instead of racing on them from the workers.
+    moonc_version()
+    json_output()
+    if jobs <= 1:
+        return [timed_check_error_code(code) for code in error_codes]
+    futures = [
+        SERVICE.submit(timed_check_error_code, error_code)
+        for error_code in error_codes
+    ]
+    return [future.result() for future in futures]
+
+
+def example_records(error_code):
+    """Return the check records of the examples of an error code."""
+    return [
+        EXAMPLE_RESULTS[path]
+        for path in (
+            str(ERROR_CODES_SOURCE_DIR / f"{error_code}_error"),
+            str(ERROR_CODES_SOURCE_DIR / f"{error_code}_fixed"),
+        )
+        if path in EXAMPLE_RESULTS
+    ]
+
+
+def print_failures(failed):
+    """Print the diagnostics of the failing examples of error codes."""
+    for error_code in failed:
+        for record in example_records(error_code):
+            if record['passed']:
+                continue
+            expected = (
+                f"[{record['expected']}]" if record['expected']
+                else 'no diagnostics')
+            print(f"  {record['example']}: expected {expected}, got:")
+            if 'error' in record:
+                print(f"    {record['error']}")
+            for diagnostic in record['diagnostics'] or [None]:
+                print(f"    {format_diagnostic(diagnostic) if diagnostic else 'no diagnostics'}")
+
+
+def write_report(path, error_codes, results, jobs, elapsed):
+    """Write a JSON report with per-code timings and diagnostics."""
+    report = {
+        'moonc_version': moonc_version(),
+        'diagnostics_format': 'json' if JSON_OUTPUT else 'text',
+        'jobs': jobs,
+        'elapsed': round(elapsed, 3),
+        'results': [
+            {
+                'code': error_code,
+                'status': example_status(error_code),
+                'passed': passed,
+                'elapsed': round(seconds, 3),
+                'examples': example_records(error_code),
+            }
+            for error_code, (passed, seconds) in zip(error_codes, results)
+        ],
+    }
+    Path(path).write_text(json.dumps(report, indent=2) + '\n')
+
+
+def write_junit(path, error_codes, results, elapsed):
+    """Write a JUnit XML report with one test case per error code."""
+    failures = sum(not passed for passed, _ in results)
+    skipped = [
+        error_code for error_code in error_codes
+        if example_status(error_code) in ('skipped', 'missing')
+    ]
+    suite = ET.Element('testsuite', {
+        'name': 'check_error_docs',
+        'tests': str(len(error_codes)),
+        'failures': str(failures),
+        'skipped': str(len(skipped)),
+        'time': f"{elapsed:.3f}",
+    })
+    for error_code, (passed, seconds) in zip(error_codes, results):
+        case = ET.SubElement(suite, 'testcase', {
+            'classname': 'error_codes',
+            'name': f"E{error_code}",
+            'time': f"{seconds:.3f}",
+        })
+        if error_code in skipped:
+            ET.SubElement(case, 'skipped', {
+                'message': example_status(error_code)})
+        elif not passed:
+            lines = []
+            for record in example_records(error_code):
+                if record['passed']:
+                    continue
+                lines.append(f"{record['example']}:")
+                lines.extend(
+                    f"  {format_diagnostic(diagnostic)}"
+                    for diagnostic in record['diagnostics'])
+                if 'error' in record:
+                    lines.append(f"  {record['error']}")
+            failure = ET.SubElement(case, 'failure', {
+                'message': f"E{error_code} examples do not match"})
+            failure.text = '\n'.join(lines)
+    ET.ElementTree(suite).write(path, encoding='utf-8', xml_declaration=True)
+
+
 def get_all_error_codes():
     """Get all error code list"""
     error_codes_path = ERROR_CODES_DIR
@@ -228,24 +638,84 @@ def main():
         '--require-examples',
         action='store_true',
         help='fail if any error code is missing monitored examples')
+    parser.add_argument(
+        '-j', '--jobs',
+        type=int,
+        default=os.cpu_count() or 1,
+        help='number of error codes to check concurrently (default: all cores)')
+    parser.add_argument(
+        '--report',
+        metavar='PATH',
+        help='write per-code results, timings and diagnostics as JSON to PATH')
+    parser.add_argument(
+        '--junit',
+        metavar='PATH',
+        help='write per-code results as JUnit XML to PATH')
+    parser.add_argument(
+        '--no-cache',
+        action='store_true',
+        help='re-check every example instead of reusing cached results')
+    parser.add_argument(
+        '--workspace',
+        action='store_true',
+        help='check examples expected to build in shared temporary '
+             'workspaces, falling back to isolated checks')
+    parser.add_argument(
+        '--watch',
+        action='store_true',
+        help='after the check, check the examples of the selected error '
+             'codes again whenever their files change')
     args = parser.parse_args()
 
+    global SERVICE
+    SERVICE = CheckService(args.jobs)
+    if not args.no_cache:
+        load_cache()
+    try:
+        status = run(args)
+        if args.watch:
+            return watch(args)
+        return status
+    finally:
+        save_cache()
+        SERVICE.close()
+
+
+def run(args):
+    """Check the error codes selected by the command line arguments."""
+
     if args.target == 'all':
         error_codes = get_all_error_codes()
         if not error_codes:
             print('No error codes found')
             return 1
 
-        failed = []
-        for error_code in error_codes:
-            if not check_error_code(error_code):
-                failed.append(error_code)
+        start = time.perf_counter()
+        if args.workspace:
+            moonc_version()
+            json_output()
+            examples, workspaces = check_in_workspaces(error_codes)
+            print(f"Workspace: {examples} examples checked in "
+                  f"{workspaces} shared workspaces")
+        results = check_error_codes(error_codes, args.jobs)
+        failed = [
+            error_code
+            for error_code, (passed, _) in zip(error_codes, results)
+            if not passed
+        ]
+        elapsed = time.perf_counter() - start
+        if args.report:
+            write_report(
+                args.report, error_codes, results, args.jobs, elapsed)
+        if args.junit:
+            write_junit(args.junit, error_codes, results, elapsed)
 
         total = len(error_codes)
         passed = total - len(failed)
 
         if failed:
             print(f"FAILED: {', '.join(failed)}")
+            print_failures(failed)
 
         print(f"Results: {passed} passed, {len(failed)} failed, {total} total")
         print_coverage_summary(error_codes)
@@ -276,11 +746,67 @@ def main():
             print(f"INCOMPLETE: {args.target}")
             return 1
 
-        success = check_error_code(args.target)
+        start = time.perf_counter()
+        success, seconds = timed_check_error_code(args.target)
+        elapsed = time.perf_counter() - start
+        if args.report:
+            write_report(
+                args.report, [args.target], [(success, seconds)], 1, elapsed)
+        if args.junit:
+            write_junit(args.junit, [args.target], [(success, seconds)], elapsed)
         status = "PASS" if success else "FAIL"
         print(f"{status}: {args.target}")
+        if not success:
+            print_failures([args.target])
         return 0 if success else 1
 
 
+def changed_error_codes(paths, error_codes):
+    """Return the error codes, among error_codes, whose examples contain paths."""
+    changed = set()
+    for path in paths:
+        try:
+            name = path.relative_to(ERROR_CODES_SOURCE_DIR).parts[0]
+        except (ValueError, IndexError):
+            continue
+        match = EXAMPLE_DIR.fullmatch(name)
+        if match and match.group(1) in error_codes:
+            changed.add(match.group(1))
+    return sorted(changed)
+
+
+def watch(args):
+    """Check error codes again whenever the files of their examples change.
+
+    The service, its toolchain probes and the result cache stay warm between
+    rounds, and only the error codes owning a changed file are checked.
+    """
+    print(f"Watching {ERROR_CODES_SOURCE_DIR} (press Ctrl+C to stop)", flush=True)
+    try:
+        for paths in watcher.changes(ERROR_CODES_SOURCE_DIR):
+            # New error codes may have been documented in the meantime.
+            error_codes = (
+                get_all_error_codes() if args.target == 'all' else [args.target])
+            changed = changed_error_codes(paths, error_codes)
+            if not changed:
+                continue
+            for error_code in changed:
+                for kind in ('error', 'fixed'):
+                    EXAMPLE_RESULTS.pop(
+                        str(ERROR_CODES_SOURCE_DIR / f"{error_code}_{kind}"), None)
+            start = time.perf_counter()
+            results = check_error_codes(changed, args.jobs)
+            elapsed = time.perf_counter() - start
+            for error_code, (passed, _) in zip(changed, results):
+                print(f"{'PASS' if passed else 'FAIL'}: {error_code}")
+                if not passed:
+                    print_failures([error_code])
+            print(f"Checked {len(changed)} error codes in {elapsed:.2f}s", flush=True)
+            save_cache()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
 if __name__ == '__main__':
     exit(main())
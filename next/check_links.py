@@ -0,0 +1,269 @@
+"""Check the internal links and anchors of the docs, offline.
+
+``make linkcheck`` fetches every external link, which is slow and needs the
+network. Most broken links are internal though: links between pages, to the
+heading anchors MyST generates (``myst_heading_anchors``), to ``(label)=``
+targets, and to error-code pages. This script indexes every page and the
+anchors it defines, then checks in one pass every internal link of the pages
+and of the translations in the catalogs of every locale.
+
+Translated pages keep the anchors of the English headings, so links in
+catalogs are checked against the same index. Links of a translation that are
+also in its source message are only reported once, for the page.
+
+It takes about a second, so it can run before every commit, for example on
+the staged files only:
+
+    python check_links.py
+    python check_links.py language/fundamentals.md locales/ja/LC_MESSAGES/language/fundamentals.po
+    git diff --cached --name-only --relative | xargs python check_links.py
+"""
+
+import argparse
+import os
+import re
+import sys
+import time
+from pathlib import Path
+
+from babel.messages.pofile import read_po
+
+from llm import HEADING, HEADING_ANCHORS, slugify, unique_slug
+
+BASE_DIR = Path(__file__).resolve().parent
+sys.path.append(str(BASE_DIR / '_ext'))
+
+import depgraph  # noqa: E402
+
+LOCALE_DIR = BASE_DIR / "locales"
+LINK = re.compile(r"!?\[(?:[^\[\]]|\[[^\]]*\])*\]\(\s*<?([^)\s>]*)>?(?:\s+\"[^\"]*\")?\s*\)")
+REFERENCE = re.compile(r"^\s*\[[^\]]+\]:\s*<?([^\s>]+)>?")
+LABEL = re.compile(r"^\((\S+)\)=\s*$")
+NAME_OPTION = re.compile(r"^\s*:name:\s*(\S+)")
+HTML_ANCHOR = re.compile(r"<a\s[^>]*(?:id|name)=\"([^\"]+)\"")
+INLINE_CODE = re.compile(r"(`+).+?\1")
+FENCE = re.compile(r"^\s*(`{3,}|~{3,}|:{3,})\s*(\{([\w:-]+)\})?")
+SCHEME = re.compile(r"^[a-zA-Z][a-zA-Z0-9+.-]*:")
+# Directives whose content is not Markdown.
+CODE_DIRECTIVES = {
+    "code-block", "code", "sourcecode", "literalinclude", "include", "toctree",
+    "math", "raw", "csv-table", "mermaid",
+}
+
+
+def markdown_lines(path):
+    """Yield (file, line number, line) for the lines of a page that are Markdown.
+
+    Code blocks are skipped; the content of directives such as notes and tabs
+    is kept, and included Markdown files are read in place.
+    """
+    text = (BASE_DIR / path).read_text(encoding="utf-8")
+    # Open fences, innermost last: (marker, whether its content is code).
+    fences = []
+    for number, line in enumerate(text.splitlines(), 1):
+        match = FENCE.match(line)
+        if fences and fences[-1][1]:
+            marker = fences[-1][0]
+            if match and match.group(1)[0] == marker[0] and len(match.group(1)) >= len(marker) \
+                    and line.strip() == match.group(1):
+                fences.pop()
+            continue
+        if match:
+            marker = match.group(1)
+            if fences and line.strip() == marker and marker[0] == fences[-1][0][0] \
+                    and len(marker) >= len(fences[-1][0]):
+                fences.pop()
+                continue
+            directive = match.group(3)
+            included = line[match.end():].strip()
+            if directive == "include" and included.endswith(".md"):
+                if included.startswith("/"):
+                    included = os.path.normpath(included.lstrip("/"))
+                else:
+                    included = os.path.normpath(os.path.join(os.path.dirname(path), included))
+                yield from markdown_lines(Path(included).as_posix())
+            fences.append((marker, directive is None or directive in CODE_DIRECTIVES))
+            continue
+        yield path, number, line
+
+
+def links(line):
+    """Return the link targets of a line of Markdown."""
+    line = INLINE_CODE.sub("", line)
+    targets = [match.group(1) for match in LINK.finditer(line)]
+    match = REFERENCE.match(line)
+    if match:
+        targets.append(match.group(1))
+    return [target for target in targets if target]
+
+
+def index_page(page):
+    """Return the anchors and labels a page defines, and its links.
+
+    Links are (file, line number, target): files a page includes are part of
+    it, and their links are relative to the page.
+    """
+    anchors = set()
+    labels = set()
+    page_links = []
+    slugs = set()
+    for path, number, line in markdown_lines(page):
+        heading = HEADING.match(line)
+        # MyST only numbers the headings it makes anchors for.
+        if heading and len(heading.group(1)) <= HEADING_ANCHORS:
+            anchors.add(unique_slug(slugify(heading.group(2)), slugs))
+        label = LABEL.match(line) or NAME_OPTION.match(line)
+        if label:
+            labels.add(label.group(1))
+        anchors.update(HTML_ANCHOR.findall(line))
+        page_links.extend((path, number, target) for target in links(line))
+    return anchors | labels, labels, page_links
+
+
+def build_index():
+    """Return the anchors of every page, the global labels and the links of every page.
+
+    Files included by other pages are indexed as part of those pages only.
+    """
+    anchors = {}
+    labels = set()
+    page_links = {}
+    for page in depgraph.pages(BASE_DIR):
+        if Path(page).name.startswith("README"):
+            continue
+        anchors[page], page_labels, page_links[page] = index_page(page)
+        labels |= page_labels
+    for page in list(anchors):
+        for path in depgraph.includes(page, BASE_DIR):
+            page_links.pop(path, None)
+    return anchors, labels, page_links
+
+
+def resolve(page, path, anchors):
+    """Return the page or file a link path points to, or None."""
+    if path.startswith("/"):
+        target = os.path.normpath(path.lstrip("/"))
+    else:
+        target = os.path.normpath(os.path.join(os.path.dirname(page), path))
+    target = Path(target).as_posix()
+    if target in anchors:
+        return target
+    # Links may name a document without its suffix.
+    for candidate in (f"{target}.md", f"{target}.mbt.md", f"{target}/index.md"):
+        if candidate in anchors:
+            return candidate
+    if (BASE_DIR / target).exists():
+        return target
+    return None
+
+
+def check_link(page, target, anchors, labels):
+    """Return why a link of a page is broken, or None."""
+    if SCHEME.match(target) or target.startswith("//"):
+        return None
+    path, _, anchor = target.partition("#")
+    if not path:
+        if anchor in anchors[page] or anchor in labels:
+            return None
+        return f"no anchor #{anchor} in {page}"
+    resolved = resolve(page, path, anchors)
+    if resolved is None:
+        return f"no page or file {path}"
+    if anchor and resolved in anchors and anchor not in anchors[resolved]:
+        return f"no anchor #{anchor} in {resolved}"
+    return None
+
+
+def catalog_links(po_file):
+    """Yield (line number, target) for the links translations add to a catalog."""
+    with open(po_file, "rb") as file:
+        catalog = read_po(file)
+    for message in catalog:
+        if not message.id or not message.string or message.fuzzy:
+            continue
+        source = set()
+        for line in message.id.splitlines():
+            source.update(links(line))
+        for line in message.string.splitlines():
+            for target in links(line):
+                if target not in source:
+                    yield message.lineno, target
+
+
+def catalog_page(po_file, language, anchors):
+    """Return the page a catalog translates, or None."""
+    docname = Path(os.path.relpath(po_file, LOCALE_DIR / language / "LC_MESSAGES")).as_posix()[:-len(".po")]
+    for page in (f"{docname}.md", f"{docname}.mbt.md"):
+        if page in anchors:
+            return page
+    return None
+
+
+def catalogs(languages):
+    """Return the catalogs of languages, with their language."""
+    result = []
+    for language in languages:
+        for root, _dirs, files in os.walk(LOCALE_DIR / language / "LC_MESSAGES"):
+            for name in sorted(files):
+                if name.endswith(".po"):
+                    result.append((language, Path(root) / name))
+    return sorted(result)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the internal links and anchors of the docs offline")
+    parser.add_argument(
+        "-l", "--language",
+        action="append",
+        help="locale whose catalogs are checked, may be repeated (default: every locale)")
+    parser.add_argument(
+        "--no-locales",
+        action="store_true",
+        help="only check the pages")
+    parser.add_argument(
+        "paths",
+        nargs="*",
+        help="pages or catalogs to check, relative to next/ (default: all); "
+             "links are always checked against every page")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    anchors, labels, page_links = build_index()
+    selected = {Path(os.path.relpath(BASE_DIR / path, BASE_DIR)).as_posix() for path in args.paths}
+
+    broken = []
+    checked = 0
+    for page, targets in page_links.items():
+        if selected and page not in selected:
+            continue
+        for path, number, target in targets:
+            checked += 1
+            reason = check_link(page, target, anchors, labels)
+            if reason:
+                broken.append(f"{path}:{number}: {target}: {reason}")
+
+    if not args.no_locales:
+        languages = args.language or sorted(
+            path.name for path in LOCALE_DIR.iterdir() if (path / "LC_MESSAGES").is_dir())
+        for language, po_file in catalogs(languages):
+            name = Path(os.path.relpath(po_file, BASE_DIR)).as_posix()
+            if selected and name not in selected:
+                continue
+            page = catalog_page(po_file, language, anchors)
+            if page is None:
+                continue
+            for number, target in catalog_links(po_file):
+                checked += 1
+                reason = check_link(page, target, anchors, labels)
+                if reason:
+                    broken.append(f"{name}:{number}: {target}: {reason}")
+
+    for line in broken:
+        print(line)
+    print(f"{checked} links in {len(anchors)} pages checked in {time.perf_counter() - start:.2f}s, "
+          f"{len(broken)} broken")
+    return 1 if broken else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -21,11 +21,9 @@ if rtd_language == 'zh-cn' or local_language == 'zh_CN':  # For local build
     author = '粤港澳大湾区数字经济院'
     copyright = '%Y, {author}'.format(author=author)
     language = 'zh_CN'
-    import jieba
-    # For Chinese searching
-    html_search_options = {
-        "dict": jieba.DEFAULT_DICT
-    }
+    # Chinese search uses jieba's default dictionary, which the zh_search
+    # extension caches; jieba is only imported by Chinese HTML builds, when
+    # their builder starts, not by conf.py.
 elif rtd_language == 'ja' or local_language in ('ja', 'ja_JP'):
     language = 'ja'
 
@@ -40,7 +38,7 @@ import sys
 from pathlib import Path
 sys.path.append(str(Path("_ext").resolve()))
 
-extensions = ['myst_parser', 'lexer', 'check', 'indent', 'sphinx_copybutton', 'sphinx_design']
+extensions = ['myst_parser', 'lexer', 'highlight', 'check', 'snippets', 'depgraph', 'indent', 'timing', 'zh_search', 'sphinx_copybutton', 'sphinx_design']
 
 templates_path = ['_templates']
 exclude_patterns = ['_build', 'Thumbs.db', '.DS_Store', ".env", '.venv', "README*.md", 'sources', 'download']
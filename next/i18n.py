@@ -0,0 +1,329 @@
+"""Incrementally update the translation catalogs.
+
+``just i18n`` extracts the messages of every page with ``make gettext`` and
+merges every template into every catalog with ``sphinx-intl update``. This
+script does the same work for the pages that changed since its last run:
+
+1. Pages whose source, included files or conf.py changed are found by hash.
+2. Only those pages are written by the gettext builder, into ``_build/gettext``.
+3. Templates whose messages changed are merged into the catalogs of every
+   locale in parallel, keeping fuzzy matches, exactly as sphinx-intl does.
+4. ``.mo`` files are compiled for the catalogs that changed.
+
+    python i18n.py update -l zh_CN -l ja
+    python i18n.py compare
+
+``compare`` times the two-step flow against this one on copies of the
+catalogs and reports whether they produce the same catalogs.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from sphinx_intl import catalog as c
+
+BASE_DIR = Path(__file__).resolve().parent
+sys.path.append(str(BASE_DIR / '_ext'))
+
+import depgraph  # noqa: E402
+
+LOCALE_DIR = BASE_DIR / "locales"
+POT_DIR = BASE_DIR / "_build" / "gettext"
+DOCTREE_DIR = BASE_DIR / "_build" / "doctrees-gettext"
+STATE_PATH = POT_DIR / "i18n-state.json"
+LANGUAGES = ["zh_CN", "ja"]
+# Same as sphinx-intl update.
+LINE_WIDTH = 76
+# Variables that make conf.py build a translated site.
+LANGUAGE_VARIABLES = ["LANGUAGE", "READTHEDOCS_LANGUAGE"]
+
+
+def file_hash(path):
+    try:
+        return hashlib.sha256(Path(path).read_bytes()).hexdigest()
+    except OSError:
+        return None
+
+
+def page_hashes():
+    """Return a hash of every page together with the files it includes."""
+    graph = depgraph.scan()
+    included = {path for deps in graph["pages"].values() for path in deps}
+    config = file_hash(BASE_DIR / "conf.py")
+    hashes = {}
+    for page, deps in graph["pages"].items():
+        if page in included or Path(page).name.startswith("README"):
+            continue
+        digest = hashlib.sha256(config.encode())
+        seen = set()
+        stack = [page]
+        while stack:
+            path = stack.pop()
+            if path in seen:
+                continue
+            seen.add(path)
+            digest.update(f"{path}\0{file_hash(BASE_DIR / path)}\0".encode())
+            stack.extend(graph["pages"].get(path, []))
+        hashes[page] = digest.hexdigest()
+    return hashes
+
+
+def docname(page):
+    """Return the document name of a page, which names its catalogs."""
+    for suffix in (".mbt.md", ".md"):
+        if page.endswith(suffix):
+            return page[:-len(suffix)]
+    return page
+
+
+def template_hash(pot_file):
+    """Return a hash of a template, ignoring its creation date."""
+    digest = hashlib.sha256()
+    with open(pot_file, "rb") as file:
+        for line in file:
+            if not line.startswith(b'"POT-Creation-Date:'):
+                digest.update(line)
+    return digest.hexdigest()
+
+
+def load_state():
+    try:
+        return json.loads(STATE_PATH.read_text())
+    except (OSError, ValueError):
+        return {"pages": {}, "templates": {}, "catalogs": {}}
+
+
+def save_state(state):
+    STATE_PATH.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = STATE_PATH.with_suffix(".tmp")
+    temp_path.write_text(json.dumps(state, indent=1, sort_keys=True) + "\n")
+    os.replace(temp_path, STATE_PATH)
+
+
+def extract(pages, pot_dir=POT_DIR, doctree_dir=DOCTREE_DIR):
+    """Write the message templates of pages with the gettext builder."""
+    env = {
+        name: value for name, value in os.environ.items()
+        if name not in LANGUAGE_VARIABLES
+    }
+    subprocess.run(
+        [
+            sys.executable, "-m", "sphinx", "-b", "gettext", "-q",
+            "-d", str(doctree_dir), ".", str(pot_dir), *pages,
+        ],
+        cwd=BASE_DIR,
+        env=env,
+        check=True,
+    )
+
+
+def update_catalog(item):
+    """Merge a template into one catalog like sphinx-intl update.
+
+    Returns (po file, status).
+    """
+    pot_file, po_file, language, _page = item
+    template = c.load_po(pot_file)
+    if not os.path.exists(po_file):
+        template.locale = language
+        c.dump_po(po_file, template, width=LINE_WIDTH)
+        return po_file, "create"
+    catalog = c.load_po(po_file)
+    msgids = {message.id for message in catalog if message.id}
+    c.update_with_fuzzy(catalog, template)
+    if msgids == {message.id for message in catalog if message.id}:
+        return po_file, "notchanged"
+    c.dump_po(po_file, catalog, width=LINE_WIDTH)
+    return po_file, "update"
+
+
+def compile_catalog(po_file):
+    """Compile a catalog into its .mo file next to it."""
+    mo_file = os.path.splitext(po_file)[0] + ".mo"
+    c.write_mo(mo_file, c.load_po(po_file))
+    return mo_file
+
+
+def update(languages, jobs, locale_dir=LOCALE_DIR, full=False, save=True):
+    """Update the catalogs of languages from the pages that changed.
+
+    A catalog is merged again when its template or the catalog itself
+    changed since it was last merged. Returns a dict of counts of what was
+    done.
+    """
+    state = load_state()
+    if full:
+        state = {"pages": {}, "templates": {}, "catalogs": {}}
+    hashes = page_hashes()
+    changed = [
+        page for page, digest in hashes.items()
+        if state["pages"].get(page) != digest
+        or not (POT_DIR / f"{docname(page)}.pot").exists()
+    ]
+    if changed:
+        extract(changed)
+
+    templates = {}
+    for page in hashes:
+        pot_file = POT_DIR / f"{docname(page)}.pot"
+        if page in changed or page not in state["templates"]:
+            # Pages without messages have no template.
+            if pot_file.exists():
+                templates[page] = template_hash(pot_file)
+        else:
+            templates[page] = state["templates"][page]
+
+    catalogs = dict(state.get("catalogs", {}))
+    items = []
+    for page, digest in templates.items():
+        for language in languages:
+            name = f"{language}/{docname(page)}.po"
+            po_file = locale_dir / language / "LC_MESSAGES" / f"{docname(page)}.po"
+            if catalogs.get(name) != [digest, file_hash(po_file)]:
+                items.append((str(POT_DIR / f"{docname(page)}.pot"), str(po_file), language, page))
+
+    status = {"pages": len(changed), "create": 0, "update": 0, "notchanged": 0}
+    with ProcessPoolExecutor(max_workers=max(jobs, 1)) as executor:
+        for (_, _, language, page), (po_file, result) in zip(items, executor.map(update_catalog, items)):
+            status[result] += 1
+            if result != "notchanged":
+                print(f"{result.capitalize()}: {os.path.relpath(po_file, locale_dir)}")
+            catalogs[f"{language}/{docname(page)}.po"] = [templates[page], file_hash(po_file)]
+        # Catalogs whose .mo is missing or older, such as the ones just updated.
+        stale = []
+        for language in languages:
+            for root, _dirs, files in os.walk(locale_dir / language):
+                for name in files:
+                    if not name.endswith(".po"):
+                        continue
+                    po_file = os.path.join(root, name)
+                    mo_file = os.path.splitext(po_file)[0] + ".mo"
+                    if not os.path.exists(mo_file) or os.path.getmtime(mo_file) < os.path.getmtime(po_file):
+                        stale.append(po_file)
+        status["compiled"] = len(list(executor.map(compile_catalog, stale)))
+
+    status["merged"] = len(items)
+    if save:
+        save_state({"pages": hashes, "templates": templates, "catalogs": catalogs})
+    return status
+
+
+def two_step(languages, locale_dir, pot_dir, doctree_dir):
+    """Run the make gettext and sphinx-intl flow of just i18n."""
+    extract([], pot_dir, doctree_dir)
+    arguments = [arg for language in languages for arg in ("-l", language)]
+    subprocess.run(
+        [
+            sys.executable, "-m", "sphinx_intl", "update", "-p", str(pot_dir),
+            "-d", str(locale_dir), *arguments,
+        ],
+        cwd=BASE_DIR,
+        check=True,
+        stdout=subprocess.DEVNULL,
+    )
+    subprocess.run(
+        [sys.executable, "-m", "sphinx_intl", "build", "-d", str(locale_dir), *arguments],
+        cwd=BASE_DIR,
+        check=True,
+        stdout=subprocess.DEVNULL,
+    )
+
+
+def catalog_lines(path):
+    with open(path, "rb") as file:
+        return [line for line in file if not line.startswith(b'"POT-Creation-Date:')]
+
+
+def differing_catalogs(left, right):
+    """Return the .po files whose messages differ between two locale trees."""
+    result = []
+    for root, _dirs, files in os.walk(left):
+        for name in files:
+            if name.endswith(".po"):
+                path = os.path.join(root, name)
+                other = os.path.join(right, os.path.relpath(path, left))
+                if not os.path.exists(other) or catalog_lines(path) != catalog_lines(other):
+                    result.append(os.path.relpath(path, left))
+    return sorted(result)
+
+
+def compare(languages, jobs):
+    """Time the two-step flow against the incremental one on copies of the catalogs."""
+    # Templates refer to pages relative to their own directory, so the
+    # two-step flow writes them next to ours for the catalogs to match.
+    pot_dir = BASE_DIR / "_build" / "gettext-compare"
+    # The gettext builder cannot reuse the environment of the other builders,
+    # so make gettext starts from scratch in practice.
+    doctree_dir = BASE_DIR / "_build" / "doctrees-compare"
+    with tempfile.TemporaryDirectory(prefix="i18n-") as temp:
+        old_locales = Path(temp) / "old"
+        new_locales = Path(temp) / "new"
+        shutil.copytree(LOCALE_DIR, old_locales, ignore=shutil.ignore_patterns("*.mo"))
+        shutil.copytree(LOCALE_DIR, new_locales, ignore=shutil.ignore_patterns("*.mo"))
+
+        start = time.perf_counter()
+        try:
+            two_step(languages, old_locales, pot_dir, doctree_dir)
+            old_time = time.perf_counter() - start
+        finally:
+            shutil.rmtree(pot_dir, ignore_errors=True)
+            shutil.rmtree(doctree_dir, ignore_errors=True)
+
+        start = time.perf_counter()
+        status = update(languages, jobs, new_locales, save=False)
+        new_time = time.perf_counter() - start
+
+        different = differing_catalogs(old_locales, new_locales)
+
+    print(f"make gettext + sphinx-intl update and build: {old_time:.2f}s")
+    print(f"incremental: {new_time:.2f}s ({status['pages']} pages extracted, "
+          f"{status['merged']} catalogs merged, {status['compiled']} compiled)")
+    if different:
+        print(f"Catalogs that differ: {', '.join(different)}")
+        return 1
+    print("Catalogs are identical")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Incrementally update the translation catalogs")
+    parser.add_argument(
+        "-l", "--language",
+        action="append",
+        help=f"locale to update, may be repeated (default: {', '.join(LANGUAGES)})")
+    parser.add_argument(
+        "-j", "--jobs",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="number of catalogs to process concurrently (default: all cores)")
+    commands = parser.add_subparsers(dest="command", required=True)
+    update_parser = commands.add_parser("update", help="update the catalogs of changed pages")
+    update_parser.add_argument(
+        "--full",
+        action="store_true",
+        help="extract and merge every page, ignoring the previous run")
+    commands.add_parser("compare", help="time the two-step flow against the incremental one")
+    args = parser.parse_args()
+
+    languages = args.language or LANGUAGES
+    if args.command == "compare":
+        return compare(languages, args.jobs)
+    start = time.perf_counter()
+    status = update(languages, args.jobs, full=args.full)
+    print(f"{status['pages']} pages extracted, {status['merged']} catalogs merged "
+          f"({status['create']} new, {status['update']} updated), "
+          f"{status['compiled']} compiled in {time.perf_counter() - start:.2f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
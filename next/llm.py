@@ -1,23 +1,33 @@
+import argparse
+import hashlib
+import json
 import os
+import re
+import subprocess
 import sys
 
-BUILD_DIR="_build/markdown"
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+BUILD_DIR = "_build/markdown"
+# Directories with a downloadable summary, in the order they appear in llm.md.
+DIRECTORIES = ["tutorial", "language", "toolchain", "example"]
+# Directories also concatenated into llm.md.
+LLM_DIRECTORIES = ["tutorial", "language"]
+BUFFER_SIZE = 1 << 20
+CHUNK_TOKENS = 512
+# Same as conf.py; deeper headings get no anchor of their own.
+HEADING_ANCHORS = 4
+PATH_MARKER = re.compile(r"^<!-- path: (.*) -->$")
+HEADING = re.compile(r"^(#+)\s+(.*?)(?:\s+#+)?\s*$")
+# A rough token count: words, CJK characters and punctuation.
+FENCE = re.compile(r"(`{3,}|~{3,})")
+TOKEN = re.compile(r"[\u3040-\u30ff\u3400-\u9fff]|\w+|[^\w\s]")
 
-def collect(directory, header_level, output_file):
-    def adjust_header(line, level):
-        if line.startswith('#'):
-            return '#' * level + line
-        return line
-
-    def process_file(filepath, level, output):
-        output.write(f"\n<!-- path: {filepath} -->\n")
-        with open(os.path.join(BUILD_DIR, filepath), "r") as file:
-            for line in file:
-                output.write(adjust_header(line, level))
 
+def toctree(directory):
+    """Return the pages of a directory: its index followed by its toctree."""
     index_path = os.path.join(directory, "index.md")
+    paths = [index_path]
     with open(index_path, "r") as index_file:
-        toctree_paths = []
         collect_paths = False
         for line in index_file:
             line = line.strip()
@@ -29,32 +39,228 @@ def collect(directory, header_level, output_file):
                     continue
                 if line == "```":
                     break
-                toctree_paths.append(os.path.join(directory, f"{line}.md"))
-
-    with open(output_file, "a") as output:
-        process_file(index_path, header_level, output)
-        for path in toctree_paths:
-            process_file(path, header_level + 1, output)
-
-def llms_txt():
-  with open(f"{BUILD_DIR}/llm.md", "w") as f:
-    with open(f"{BUILD_DIR}/index.md", "r") as g:
-      print(f"<!-- path: index.md -->", file=f)
-      for line in g:
-        f.write(line)
-  
-  collect("tutorial", 1, f"{BUILD_DIR}/llm.md")
-  collect("language", 1, f"{BUILD_DIR}/llm.md")
+                paths.append(os.path.join(directory, f"{line}.md"))
+    return paths
+
+
+def adjust_headers(text, level):
+    """Demote every Markdown heading in text by level."""
+    if level == 0:
+        return text
+    return re.sub(r"^(?=#)", "#" * level, text, flags=re.MULTILINE)
+
+
+def generate(build_dir=BUILD_DIR):
+    """Write llm.md and the download summaries in a single pass over the build.
+
+    Every page is read once and written to each output that includes it.
+    """
+    with open(os.path.join(build_dir, "llm.md"), "w", buffering=BUFFER_SIZE) as llm:
+        print("<!-- path: index.md -->", file=llm)
+        with open(os.path.join(build_dir, "index.md"), "r") as index:
+            llm.write(index.read())
+
+        for directory in DIRECTORIES:
+            output_file = f"download/{directory}/summary.md"
+            os.makedirs(os.path.dirname(output_file), exist_ok=True)
+            with open(output_file, "w", buffering=BUFFER_SIZE) as summary:
+                # (output, heading level of the directory index)
+                outputs = [(summary, 0)]
+                if directory in LLM_DIRECTORIES:
+                    outputs.append((llm, 1))
+                for position, filepath in enumerate(toctree(directory)):
+                    with open(os.path.join(build_dir, filepath), "r") as file:
+                        text = file.read()
+                    for output, level in outputs:
+                        output.write(f"\n<!-- path: {filepath} -->\n")
+                        output.write(adjust_headers(text, level + (position > 0)))
+
+
+def slugify(title):
+    """Return the anchor MyST generates for a heading title."""
+    title = re.sub(r"\[([^\]]*)\]\([^)]*\)", r"\1", title).replace("`", "").replace("*", "")
+    return re.sub(r"[^\w\u4e00-\u9fff\- ]", "", title.lower().replace(" ", "-"))
+
+
+def unique_slug(slug, slugs):
+    """Deduplicate a slug within a page like MyST does."""
+    i = 1
+    while slug in slugs:
+        slug = f"{slug}-{i}"
+        i += 1
+    slugs.add(slug)
+    return slug
+
+
+def code_fence(fence, line):
+    """Return the code fence open after a line: its marker, or None.
+
+    fence is the one open before the line. A fence is closed by a line of
+    the same character, at least as long as its opening marker, so a fence
+    of four backticks may hold ```moonbit blocks.
+    """
+    stripped = line.strip()
+    if fence is None:
+        match = FENCE.match(stripped)
+        return match.group(1) if match else None
+    if stripped and stripped == fence[0] * len(stripped) and len(stripped) >= len(fence):
+        return None
+    return fence
+
+
+def sections(data):
+    """Split llm.md into sections at page markers and headings.
+
+    Yields (path, anchor, start, end) with byte offsets into data.
+    """
+    path, anchor, start = "index.md", "", 0
+    offset = 0
+    fence = None
+    slugs = set()
+    level_offset = None
+    for raw in data.splitlines(keepends=True):
+        line = raw.decode("utf-8").rstrip("\r\n")
+        if (marker := PATH_MARKER.match(line)) is not None:
+            # Pages are concatenated, so a fence left open by a page ends with it.
+            if offset > start:
+                yield path, anchor, start, offset
+            path, anchor, start = marker.group(1), "", offset
+            slugs = set()
+            level_offset = None
+            fence = None
+        elif fence is not None or FENCE.match(line.strip()):
+            fence = code_fence(fence, line)
+        elif (heading := HEADING.match(line)) is not None:
+            level = len(heading.group(1))
+            if level_offset is None:
+                # Every page starts with its title, so this undoes the
+                # demotion applied when concatenating the page.
+                level_offset = level - 1
+            if level - level_offset <= HEADING_ANCHORS:
+                if offset > start:
+                    yield path, anchor, start, offset
+                anchor = unique_slug(slugify(heading.group(2)), slugs)
+                start = offset
+        offset += len(raw)
+    if offset > start:
+        yield path, anchor, start, offset
+
+
+def paragraphs(data, start, end):
+    """Yield (start, end, tokens) of the blank-line separated blocks of a section.
+
+    Code fences are never split.
+    """
+    block_start, tokens = start, 0
+    offset = start
+    fence = None
+    for raw in data[start:end].splitlines(keepends=True):
+        offset += len(raw)
+        line = raw.decode("utf-8")
+        fence = code_fence(fence, line)
+        tokens += len(TOKEN.findall(line))
+        if fence is None and not raw.strip():
+            yield block_start, offset, tokens
+            block_start, tokens = offset, 0
+    if offset > block_start:
+        yield block_start, offset, tokens
+
+
+def split_section(data, start, end, budget):
+    """Split a section into pieces of at most budget tokens at paragraph breaks.
+
+    A single paragraph above the budget is kept whole.
+    """
+    pieces = []
+    for block_start, block_end, tokens in paragraphs(data, start, end):
+        if pieces and pieces[-1][2] + tokens <= budget:
+            piece_start, _, piece_tokens = pieces[-1]
+            pieces[-1] = (piece_start, block_end, piece_tokens + tokens)
+        else:
+            pieces.append((block_start, block_end, tokens))
+    return pieces
+
+
+def chunk_corpus(build_dir=BUILD_DIR, budget=CHUNK_TOKENS, previous_path=None):
+    """Write the chunk manifest of llm.md and its diff against the previous one.
+
+    Each manifest line describes one heading-aware chunk of llm.md: its page,
+    anchor, byte range, approximate token count and content hash. The previous
+    manifest is previous_path, such as the last published one, or else the
+    one left in build_dir by the last run; without one every chunk is added.
+    """
+    data = open(os.path.join(build_dir, "llm.md"), "rb").read()
+    manifest_path = os.path.join(build_dir, "llm-chunks.jsonl")
+    previous_path = previous_path or manifest_path
+    previous = {}
+    if os.path.exists(previous_path):
+        with open(previous_path, "r") as manifest:
+            for line in manifest:
+                chunk = json.loads(line)
+                previous[chunk["id"]] = chunk["hash"]
+
+    chunks = []
+    for path, anchor, start, end in sections(data):
+        for part, (piece_start, piece_end, tokens) in enumerate(split_section(data, start, end, budget)):
+            chunks.append({
+                "id": f"{path}#{anchor}" + (f"/{part}" if part else ""),
+                "path": path,
+                "anchor": anchor,
+                "start": piece_start,
+                "end": piece_end,
+                "tokens": tokens,
+                "hash": hashlib.sha256(data[piece_start:piece_end]).hexdigest(),
+            })
+
+    with open(manifest_path, "w", buffering=BUFFER_SIZE) as manifest:
+        for chunk in chunks:
+            manifest.write(json.dumps(chunk, ensure_ascii=False) + "\n")
+
+    current = {chunk["id"]: chunk["hash"] for chunk in chunks}
+    diff = {
+        "added": [id for id in current if id not in previous],
+        "removed": [id for id in previous if id not in current],
+        "changed": [id for id in current if id in previous and previous[id] != current[id]],
+    }
+    diff["unchanged"] = len(current) - len(diff["added"]) - len(diff["changed"])
+    with open(os.path.join(build_dir, "llm-chunks.diff.json"), "w") as output:
+        json.dump(diff, output, indent=2, ensure_ascii=False)
+        output.write("\n")
+    return diff
+
 
 def main():
-  os.system("make markdown")
-  llms_txt()
-  for directory in ["tutorial", "language", "toolchain", "example"]:
-    output_file = f"download/{directory}/summary.md"
-    os.makedirs(os.path.dirname(output_file), exist_ok=True)
-    if os.path.exists(output_file):
-      os.remove(output_file)
-    collect(directory, 0, output_file)
+    parser = argparse.ArgumentParser(
+        description="Generate llm.md and the download summaries from the Markdown build")
+    parser.add_argument(
+        "--no-build",
+        action="store_true",
+        help=f"reuse the existing {BUILD_DIR} instead of running make markdown")
+    parser.add_argument(
+        "--chunk-tokens",
+        type=int,
+        default=CHUNK_TOKENS,
+        help=f"approximate token budget of an llm.md chunk (default: {CHUNK_TOKENS})")
+    parser.add_argument(
+        "--previous",
+        metavar="PATH",
+        help="chunk manifest to diff against, such as the last published one "
+             f"(default: {BUILD_DIR}/llm-chunks.jsonl from the last run)")
+    args = parser.parse_args()
+
+    previous = os.path.abspath(args.previous) if args.previous else None
+    os.chdir(BASE_DIR)
+    if not args.no_build:
+        result = subprocess.run(["make", "markdown"])
+        if result.returncode != 0:
+            return result.returncode
+    generate()
+    diff = chunk_corpus(budget=args.chunk_tokens, previous_path=previous)
+    print(
+        f"llm.md chunks: {len(diff['added'])} added, {len(diff['changed'])} changed, "
+        f"{len(diff['removed'])} removed, {diff['unchanged']} unchanged")
+    return 0
+
 
 if __name__ == "__main__":
-  main()
\ No newline at end of file
+    sys.exit(main())
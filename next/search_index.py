@@ -0,0 +1,365 @@
+"""Build and query a sharded full-text search index of the Markdown build.
+
+The index is built from ``_build/markdown`` (run ``make markdown`` first, with
+``LANGUAGE`` set for a translated build) and written to
+``_build/search/<language>``:
+
+- ``index.json`` gives the language, the number of sections and the prefixes
+  of the term shards.
+- ``sections-<n>.json`` hold the page path, anchor and title of every indexed
+  section, ``SECTION_CHUNK`` sections per file, so a client only loads the
+  rows of the results it shows. A row's path is empty when it is the one of
+  the row before.
+- ``<prefix>.json`` shards hold the postings of all terms starting with the
+  same two characters (one for CJK), so a client only loads the shards of the
+  terms it looks up. A one-character prefix, such as the first keystroke of
+  search-as-you-type, loads every shard starting with it.
+
+Postings are flat lists of section id deltas and scores, which keeps the
+numbers short.
+
+Terms are words of the prose, CJK words (with jieba for Chinese when it is
+installed, character bigrams otherwise) and identifiers from MoonBit code
+blocks. English stop words are left out, as in Sphinx's own index; every
+build has English prose in code comments and untranslated text.
+
+    python search_index.py build --language zh_CN
+    python search_index.py query "derive trait"
+    python search_index.py bench "derive" "async fn" "E4015"
+"""
+
+import argparse
+import json
+import math
+import os
+import re
+import sys
+import time
+from collections import Counter, defaultdict
+
+from sphinx.search.en import english_stopwords
+
+from llm import HEADING, slugify, unique_slug
+
+BUILD_DIR = "_build/markdown"
+INDEX_DIR = "_build/search"
+TITLE_WEIGHT = 5
+SECTION_CHUNK = 16
+WORD = re.compile(r"[a-z0-9_]+")
+CJK = re.compile(r"[\u3040-\u30ff\u3400-\u9fff]+")
+IDENTIFIER = re.compile(r"@?[A-Za-z_][A-Za-z0-9_]*")
+CODE_LANGUAGES = {"moonbit", "mbt"}
+
+
+def is_cjk(c):
+    return CJK.match(c) is not None
+
+
+def cjk_terms(text, language):
+    """Return the search terms of a run of CJK characters."""
+    if language.startswith("zh"):
+        try:
+            import jieba
+        except ImportError:
+            pass
+        else:
+            return [term for term in jieba.cut_for_search(text) if term.strip()]
+    if len(text) == 1:
+        return [text]
+    return [text[i:i + 2] for i in range(len(text) - 1)]
+
+
+def terms(text, language):
+    """Return the search terms of prose."""
+    text = text.lower()
+    result = WORD.findall(text)
+    for run in CJK.findall(text):
+        result.extend(cjk_terms(run, language))
+    return result
+
+
+def code_terms(code):
+    """Return the identifiers of a MoonBit code block, with their parts."""
+    result = []
+    for identifier in IDENTIFIER.findall(code):
+        identifier = identifier.lower().lstrip("@")
+        result.append(identifier)
+        parts = [part for part in identifier.split("_") if part]
+        if len(parts) > 1:
+            result.extend(parts)
+    return result
+
+
+def sections(text):
+    """Split a page into (anchor, title, prose, code) sections at headings."""
+    anchor, title = "", ""
+    prose, code = [], []
+    fence = None
+    slugs = set()
+    for line in text.splitlines():
+        stripped = line.strip()
+        if fence is not None:
+            if stripped.startswith(fence[0]):
+                fence = None
+            elif fence[1] in CODE_LANGUAGES:
+                code.append(line)
+            else:
+                prose.append(line)
+            continue
+        if stripped.startswith("```") or stripped.startswith("~~~"):
+            fence = (stripped[:3], stripped[3:].strip().split(" ")[0].strip("{}"))
+            continue
+        heading = HEADING.match(line)
+        if heading is not None:
+            if prose or code or title:
+                yield anchor, title, "\n".join(prose), "\n".join(code)
+            title = heading.group(2)
+            anchor = unique_slug(slugify(title), slugs)
+            prose, code = [], []
+            continue
+        prose.append(line)
+    if prose or code or title:
+        yield anchor, title, "\n".join(prose), "\n".join(code)
+
+
+def shard_prefix(term):
+    """Return the prefix of the shard a term belongs to."""
+    return term[:1] if is_cjk(term[:1]) else term[:2]
+
+
+def shard_key(prefix):
+    """Return the file name of the shard of a prefix, without extension."""
+    return prefix.encode("utf-8").hex()
+
+
+def build(build_dir=BUILD_DIR, output_dir=None, language="en"):
+    """Build the index of a Markdown build and return the output directory."""
+    output_dir = output_dir or os.path.join(INDEX_DIR, language)
+    section_list = []
+    postings = defaultdict(list)
+    for root, dirs, files in os.walk(build_dir):
+        dirs.sort()
+        for name in sorted(files):
+            if not name.endswith(".md") or name == "llm.md":
+                continue
+            file = os.path.join(root, name)
+            path = os.path.relpath(file, build_dir).replace(os.sep, "/")
+            with open(file, "r", encoding="utf-8") as page:
+                text = page.read()
+            for anchor, title, prose, code in sections(text):
+                counts = Counter(terms(prose, language))
+                counts.update(code_terms(code))
+                for term in terms(title, language):
+                    counts[term] += TITLE_WEIGHT
+                for term in english_stopwords:
+                    counts.pop(term, None)
+                if not counts:
+                    continue
+                section_id = len(section_list)
+                section_list.append([path, anchor, title])
+                for term, count in counts.items():
+                    postings[term].append((section_id, count))
+
+    shards = defaultdict(dict)
+    total = len(section_list)
+    for term, entries in postings.items():
+        idf = math.log(1 + total / len(entries))
+        flat = []
+        previous = 0
+        # Sections are added in order, so the deltas are positive.
+        for section_id, count in entries:
+            # Scores are stored as small integers to keep shards small.
+            flat.extend((section_id - previous, max(1, round(10 * (1 + math.log(count)) * idf))))
+            previous = section_id
+        shards[shard_prefix(term)][term] = flat
+
+    os.makedirs(output_dir, exist_ok=True)
+    for name in os.listdir(output_dir):
+        if name.endswith(".json"):
+            os.remove(os.path.join(output_dir, name))
+    write_json(os.path.join(output_dir, "index.json"), {
+        "language": language,
+        "sections": total,
+        "shards": sorted(shards),
+    })
+    for start in range(0, total, SECTION_CHUNK):
+        rows = section_list[start:start + SECTION_CHUNK]
+        rows = [
+            ["" if index and path == rows[index - 1][0] else path, anchor, title]
+            for index, (path, anchor, title) in enumerate(rows)
+        ]
+        write_json(os.path.join(output_dir, f"sections-{start // SECTION_CHUNK}.json"), rows)
+    for prefix, shard in shards.items():
+        write_json(os.path.join(output_dir, f"{shard_key(prefix)}.json"), shard)
+    return output_dir
+
+
+def write_json(path, value):
+    with open(path, "w", encoding="utf-8") as output:
+        json.dump(value, output, ensure_ascii=False, separators=(",", ":"))
+
+
+def read_json(path):
+    with open(path, "r", encoding="utf-8") as file:
+        return json.load(file)
+
+
+class SearchIndex:
+    """Query a built index, loading shards and sections on first use."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        meta = read_json(os.path.join(directory, "index.json"))
+        self.language = meta["language"]
+        self.prefixes = meta["shards"]
+        self.shards = {}
+        self.chunks = {}
+
+    def shard(self, prefix):
+        if prefix not in self.shards:
+            try:
+                self.shards[prefix] = read_json(os.path.join(self.directory, f"{shard_key(prefix)}.json"))
+            except FileNotFoundError:
+                self.shards[prefix] = {}
+        return self.shards[prefix]
+
+    def section(self, section_id):
+        """Return the page path, anchor and title of a section."""
+        chunk = section_id // SECTION_CHUNK
+        if chunk not in self.chunks:
+            rows = read_json(os.path.join(self.directory, f"sections-{chunk}.json"))
+            for index in range(1, len(rows)):
+                if not rows[index][0]:
+                    rows[index][0] = rows[index - 1][0]
+            self.chunks[chunk] = rows
+        return self.chunks[chunk][section_id % SECTION_CHUNK]
+
+    def postings(self, term, prefix=False):
+        """Return the flat (section id delta, score) lists of the terms matching term."""
+        if not prefix:
+            return [self.shard(shard_prefix(term)).get(term, [])]
+        if len(term) < 2 and not is_cjk(term):
+            # The term is shorter than a shard prefix: every shard starting
+            # with it may hold matching terms.
+            prefixes = [candidate for candidate in self.prefixes if candidate.startswith(term)]
+        else:
+            prefixes = [shard_prefix(term)]
+        return [
+            flat
+            for shard in map(self.shard, prefixes)
+            for candidate, flat in shard.items()
+            if candidate.startswith(term)
+        ]
+
+    def query(self, text, limit=10):
+        """Return the best matching sections for a query.
+
+        Every term has to match; the last one may be a prefix of a longer
+        term, as in search-as-you-type.
+        """
+        query_terms = terms(text, self.language)
+        # Stop words are not indexed, but the last term may be the prefix of
+        # a longer word, such as "a" of "async".
+        query_terms = [term for term in query_terms[:-1] if term not in english_stopwords] + query_terms[-1:]
+        if not query_terms:
+            return []
+        scores = None
+        for position, term in enumerate(query_terms):
+            term_scores = defaultdict(int)
+            for flat in self.postings(term, prefix=position == len(query_terms) - 1):
+                section_id = 0
+                for i in range(0, len(flat), 2):
+                    section_id += flat[i]
+                    term_scores[section_id] += flat[i + 1]
+            if scores is None:
+                scores = term_scores
+            else:
+                scores = {
+                    section_id: score + term_scores[section_id]
+                    for section_id, score in scores.items()
+                    if section_id in term_scores
+                }
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:limit]
+        return [
+            {"path": path, "anchor": anchor, "title": title, "score": score}
+            for (path, anchor, title), score in
+            ((self.section(section_id), score) for section_id, score in ranked)
+        ]
+
+
+def directory_size(directory):
+    return sum(
+        os.path.getsize(os.path.join(directory, name))
+        for name in os.listdir(directory)
+    )
+
+
+def loaded_size(index):
+    """Return the bytes of the files a query of index has loaded."""
+    names = ["index.json"]
+    names += [f"{shard_key(prefix)}.json" for prefix, shard in index.shards.items() if shard]
+    names += [f"sections-{chunk}.json" for chunk in index.chunks]
+    return sum(os.path.getsize(os.path.join(index.directory, name)) for name in names)
+
+
+def bench(directory, queries, repeat=20):
+    """Print the index size and the query latency against the Sphinx index."""
+    size = directory_size(directory)
+    index = SearchIndex(directory)
+    names = os.listdir(directory)
+    sections_size = sum(
+        os.path.getsize(os.path.join(directory, name))
+        for name in names if name.startswith("sections-"))
+    shard_sizes = sorted(
+        os.path.getsize(os.path.join(directory, name))
+        for name in names if not name.startswith("sections-") and name != "index.json"
+    )
+    print(f"index: {size / 1024:.1f} KiB in {len(names)} files, "
+          f"sections {sections_size / 1024:.1f} KiB, "
+          f"median shard {shard_sizes[len(shard_sizes) // 2] / 1024:.1f} KiB")
+    stock = os.path.join("_build", "html", "searchindex.js")
+    if os.path.exists(stock):
+        print(f"stock searchindex.js: {os.path.getsize(stock) / 1024:.1f} KiB")
+    for text in queries:
+        start = time.perf_counter()
+        cold = SearchIndex(directory)
+        results = cold.query(text)
+        cold_time = time.perf_counter() - start
+        loaded = loaded_size(cold)
+        start = time.perf_counter()
+        for _ in range(repeat):
+            index.query(text)
+        warm_time = (time.perf_counter() - start) / repeat
+        print(f"{text!r}: {len(results)} results, cold {cold_time * 1000:.2f} ms "
+              f"({loaded / 1024:.1f} KiB loaded), warm {warm_time * 1000:.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline search index of the Markdown build")
+    parser.add_argument("--index-dir", help=f"index directory (default: {INDEX_DIR}/<language>)")
+    parser.add_argument("--language", default="en", help="language of the Markdown build (default: en)")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("build", help=f"index {BUILD_DIR}")
+    query = commands.add_parser("query", help="search the index")
+    query.add_argument("text")
+    query.add_argument("-n", "--limit", type=int, default=10)
+    benchmark = commands.add_parser("bench", help="measure index size and query latency")
+    benchmark.add_argument("queries", nargs="+")
+    args = parser.parse_args()
+
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    directory = args.index_dir or os.path.join(INDEX_DIR, args.language)
+    if args.command == "build":
+        start = time.perf_counter()
+        build(output_dir=directory, language=args.language)
+        print(f"Indexed {BUILD_DIR} into {directory} in {time.perf_counter() - start:.2f}s")
+    elif args.command == "query":
+        for result in SearchIndex(directory).query(args.text, args.limit):
+            print(f"{result['score']:6d}  {result['path']}#{result['anchor']}  {result['title']}")
+    else:
+        bench(directory, args.queries)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
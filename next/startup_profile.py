@@ -0,0 +1,143 @@
+"""Report where the startup time of a docs build goes.
+
+Starts Sphinx as ``make html`` does, loading conf.py, the extensions, the
+builder and the saved environment, but without reading or writing any page.
+Python's ``-X importtime`` gives the time spent importing each module, which
+is reported per top-level package, and the ``setup()`` of every extension is
+timed separately, so that work done at load time, such as probing the
+toolchain, shows up as well.
+
+    python startup_profile.py
+    python startup_profile.py -l zh_CN --top 30
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent
+BUILD_DIR = BASE_DIR / "_build"
+# Variables that make conf.py build a translated site.
+LANGUAGE_VARIABLES = ["LANGUAGE", "READTHEDOCS_LANGUAGE"]
+
+# Runs in the profiled interpreter and prints its timings as JSON.
+PROFILE = """
+import json, sys, time
+start = time.perf_counter()
+from sphinx.application import Sphinx
+from sphinx.registry import SphinxComponentRegistry
+imported = time.perf_counter()
+
+setups = {}
+load_extension = SphinxComponentRegistry.load_extension
+def timed(self, app, extname):
+    extension_start = time.perf_counter()
+    try:
+        return load_extension(self, app, extname)
+    finally:
+        # Extensions loaded by other extensions are counted in both.
+        setups.setdefault(extname, time.perf_counter() - extension_start)
+SphinxComponentRegistry.load_extension = timed
+
+builder, outdir, doctreedir = sys.argv[1:]
+Sphinx(".", ".", outdir, doctreedir, builder, status=None, warning=None)
+end = time.perf_counter()
+print(json.dumps({"sphinx": imported - start, "app": end - imported, "extensions": setups}))
+"""
+
+
+def build_env(language):
+    env = {
+        name: value for name, value in os.environ.items()
+        if name not in LANGUAGE_VARIABLES
+    }
+    if language != "en":
+        env["LANGUAGE"] = language
+    return env
+
+
+def parse_importtime(stderr):
+    """Return (module, self seconds, cumulative seconds) from -X importtime output."""
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            # The header line.
+            continue
+        modules.append((fields[2].strip(), int(fields[0]) / 1e6, int(fields[1]) / 1e6))
+    return modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report the startup time of a docs build")
+    parser.add_argument(
+        "-l", "--language",
+        default="en",
+        help="locale of the build (default: en)")
+    parser.add_argument(
+        "-b", "--builder",
+        default="html",
+        help="Sphinx builder (default: html)")
+    parser.add_argument(
+        "-d", "--doctree-dir",
+        default=BUILD_DIR / "doctrees",
+        help="doctree directory, whose environment is loaded (default: _build/doctrees)")
+    parser.add_argument(
+        "--top",
+        type=int,
+        default=15,
+        help="number of packages, modules and extensions to list (default: 15)")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    result = subprocess.run(
+        [
+            sys.executable, "-X", "importtime", "-c", PROFILE, args.builder,
+            str(BUILD_DIR / args.builder), str(args.doctree_dir),
+        ],
+        cwd=BASE_DIR,
+        env=build_env(args.language),
+        capture_output=True,
+        text=True,
+    )
+    wall = time.perf_counter() - start
+    if result.returncode != 0:
+        print(result.stderr, end="")
+        return result.returncode
+    timings = json.loads(result.stdout.splitlines()[-1])
+    modules = parse_importtime(result.stderr)
+
+    packages = defaultdict(float)
+    for name, own, _cumulative in modules:
+        packages[name.split(".")[0]] += own
+    imports = sum(own for _name, own, _cumulative in modules)
+
+    print(f"Startup of a {args.language} {args.builder} build: {wall:.2f}s")
+    print(f"  import sphinx      {timings['sphinx']:8.3f}s")
+    print(f"  configure and init {timings['app']:8.3f}s")
+    print(f"  imports in total   {imports:8.3f}s ({len(modules)} modules)")
+
+    print("\nImport time by package:")
+    for name, seconds in sorted(packages.items(), key=lambda item: item[1], reverse=True)[:args.top]:
+        print(f"  {seconds:8.3f}s  {name}")
+
+    print("\nSlowest modules (own time):")
+    for name, own, cumulative in sorted(modules, key=lambda module: module[1], reverse=True)[:args.top]:
+        print(f"  {own:8.3f}s  {name} ({cumulative:.3f}s with its imports)")
+
+    print("\nExtension setup (with the imports it triggers):")
+    extensions = sorted(timings["extensions"].items(), key=lambda item: item[1], reverse=True)
+    for name, seconds in extensions[:args.top]:
+        print(f"  {seconds:8.3f}s  {name}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,64 +1,232 @@
 #!/usr/bin/env python3
+import argparse
+import os
 import subprocess
 import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
+sys.path.append(str(Path(__file__).resolve().parent.parent / "next" / "_ext"))
+import cram  # noqa: E402
+import depgraph  # noqa: E402
+import watcher  # noqa: E402
 
-def main():
-    # Process directories
-    failed = []
-    for dir_path in sorted(Path("next/sources").iterdir()):
+DOCS_DIR = Path("next")
+SOURCES_DIR = DOCS_DIR / "sources"
+# The moon toolchain version the transcript cache is keyed by, probed on first use.
+TOOLCHAIN_VERSION = None
+
+
+def projects():
+    """Return the example projects checked by this script."""
+    result = []
+    for dir_path in sorted(SOURCES_DIR.iterdir()):
         if not dir_path.is_dir() or dir_path.name.startswith('.') or dir_path.name == "target":
             continue
 
         # Skip error codes; they should be handled with another script.
-        # Script mode has command transcripts checked by scrut.
-        if dir_path.name in {"error_codes", "script-mode"}:
+        if dir_path.name == "error_codes":
             continue
 
-        # These examples require the native backend.
-        targets = "all"
-        if dir_path.name in {"async", "cli-quickstart"}:
-            targets = "native"
+        result.append(dir_path)
+    return result
 
-        print(f"Processing {dir_path}")
 
-        # Run moon commands (no moon install here; assume deps are pre-resolved)
+def changed_files(ref):
+    """Return the files changed since the merge base with a git ref, including uncommitted ones.
+
+    Changes made on ref itself since the branch point are not included.
+    """
+    commands = [
+        ["git", "diff", "--name-only", f"{ref}...HEAD", "--", "."],
+        ["git", "diff", "--name-only", "HEAD", "--", "."],
+        ["git", "ls-files", "--others", "--exclude-standard", "--", "."],
+    ]
+    lines = set()
+    for command in commands:
+        result = subprocess.run(command, capture_output=True, text=True, check=True)
+        lines.update(result.stdout.splitlines())
+    return sorted(lines)
+
+
+def changed_projects(ref):
+    """Return the names of source projects affected by changes since a git ref."""
+    paths = []
+    for line in changed_files(ref):
+        path = Path(line)
+        if path in {Path("scripts/check-document.py"), Path("scripts/cram.py"), Path("next/_ext/depgraph.py")}:
+            # The checker itself, or how it finds affected projects, changed,
+            # so check everything.
+            return None
+        if path.parts[:1] == DOCS_DIR.parts:
+            paths.append(Path(*path.parts[1:]).as_posix())
+    affected = depgraph.affected(depgraph.scan(), paths)
+    # Projects are checked per example directory, e.g. a whole workspace.
+    return {Path(name).parts[1] for name in affected["projects"] if Path(name).parts[0] == SOURCES_DIR.name}
+
+
+def changed_dirs(paths):
+    """Return the example directories containing changed paths."""
+    sources_dir = SOURCES_DIR.resolve()
+    names = set()
+    for path in paths:
         try:
-            if dir_path.name == "single-file":
-                subprocess.run(
-                    ["moon", "check", "README.mbt.md"],
-                    cwd=dir_path,
-                    check=True,
-                )
-                subprocess.run(
-                    ["moon", "test", "README.mbt.md"],
-                    cwd=dir_path,
-                    check=True,
-                )
-                print(f"OK: {dir_path.name}")
-                continue
-            subprocess.run(
-                ["moon", "check", "--deny-warn", "--target", targets],
-                cwd=dir_path,
-                check=True,
-            )
-            subprocess.run(
-                ["moon", "test", "--deny-warn", "--target", targets],
-                cwd=dir_path,
-                check=True,
-            )
+            names.add(path.relative_to(sources_dir).parts[0])
+        except (ValueError, IndexError):
+            continue
+    return [dir_path for dir_path in projects() if dir_path.name in names]
+
+
+def toolchain_version():
+    global TOOLCHAIN_VERSION
+    if TOOLCHAIN_VERSION is None:
+        TOOLCHAIN_VERSION = cram.toolchain_version()
+    return TOOLCHAIN_VERSION
+
+
+def is_moon_project(dir_path):
+    """Return whether a directory has more than command transcripts, such as script-mode."""
+    return any(path.suffix != ".cram" for path in dir_path.iterdir())
+
+
+def check_project(dir_path):
+    """Check and test one project, returning whether it passed and its output."""
+    # These examples require the native backend.
+    targets = "all"
+    if dir_path.name in {"async", "cli-quickstart"}:
+        targets = "native"
+
+    # Run moon commands (no moon install here; assume deps are pre-resolved)
+    if dir_path.name == "single-file":
+        commands = [
+            ["moon", "check", "README.mbt.md"],
+            ["moon", "test", "README.mbt.md"],
+        ]
+    else:
+        commands = [
+            ["moon", "check", "--deny-warn", "--target", targets],
+            ["moon", "test", "--deny-warn", "--target", targets],
+        ]
+
+    output = []
+    for command in commands:
+        result = subprocess.run(
+            command,
+            cwd=dir_path,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+        )
+        output.append(result.stdout)
+        if result.returncode != 0:
+            return False, "".join(output)
+    return True, "".join(output)
+
+
+def check(dir_paths, executor, cache):
+    """Check example directories, printing each result, and return the failed names."""
+    moon_projects = [dir_path for dir_path in dir_paths if is_moon_project(dir_path)]
+    transcripts = [path for dir_path in dir_paths for path in cram.transcripts(dir_path)]
+    version = toolchain_version() if transcripts else ""
+
+    # Process directories; each project's output is printed in one piece.
+    failed = []
+    # Transcript cases share the pool with the projects.
+    cases = {
+        path: [(case, executor.submit(cram.check_case, case, cache, version)) for case in cram.parse(path)]
+        for path in transcripts
+    }
+    for dir_path, (ok, output) in zip(moon_projects, executor.map(check_project, moon_projects)):
+        print(f"Processing {dir_path}")
+        print(output, end="", flush=True)
+        if ok:
             print(f"OK: {dir_path.name}")
-        except subprocess.CalledProcessError:
+        else:
             print(f"FAIL: {dir_path.name}")
             failed.append(dir_path.name)
+    for path, futures in cases.items():
+        ok, output = cram.report(
+            path, [case for case, _ in futures], [future.result() for _, future in futures])
+        print(f"Processing {path}")
+        print(output, end="", flush=True)
+        if ok:
+            print(f"OK: {path.name}")
+        else:
+            print(f"FAIL: {path.name}")
+            failed.append(path.name)
+    if cache is not None:
+        cram.save_cache(cache)
+    return failed
+
 
-    # Report results
+def watch(executor, cache):
+    """Check example directories again whenever their files change.
+
+    The pool and the transcript cache stay warm between rounds, and only the
+    directories owning a changed file are checked.
+    """
+    print(f"Watching {SOURCES_DIR} (press Ctrl+C to stop)", flush=True)
+    try:
+        for paths in watcher.changes(SOURCES_DIR.resolve()):
+            dir_paths = changed_dirs(paths)
+            if not dir_paths:
+                continue
+            start = time.perf_counter()
+            failed = check(dir_paths, executor, cache)
+            elapsed = time.perf_counter() - start
+            print(f"\n{'Failed: ' + ', '.join(failed) if failed else 'All examples passed!'} "
+                  f"({len(dir_paths)} checked in {elapsed:.2f}s)", flush=True)
+    except KeyboardInterrupt:
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Check runnable MoonBit examples used by docs")
+    parser.add_argument(
+        "-j", "--jobs",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="number of projects to check concurrently (default: all cores)")
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="run every command transcript, even if its cached outputs still pass")
+    parser.add_argument(
+        "--changed-since",
+        metavar="REF",
+        help="only check projects affected by the changes since the merge base with the git ref REF, "
+             "committed or not")
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="after the check, check examples again whenever their files change")
+    args = parser.parse_args()
+
+    dir_paths = projects()
+    if args.changed_since:
+        names = changed_projects(args.changed_since)
+        if names is not None:
+            dir_paths = [dir_path for dir_path in dir_paths if dir_path.name in names]
+        if not dir_paths and not args.watch:
+            print("No affected examples")
+            return
+
+    cache = None if args.no_cache else cram.load_cache()
+    with ThreadPoolExecutor(max_workers=max(args.jobs, 1)) as executor:
+        failed = check(dir_paths, executor, cache)
+
+        # Report results
+        if failed:
+            print(f"\nFailed: {', '.join(failed)}")
+        else:
+            print("\nAll examples passed!")
+        if args.watch:
+            watch(executor, cache)
+            return
     if failed:
-        print(f"\nFailed: {', '.join(failed)}")
         sys.exit(1)
-    else:
-        print("\nAll examples passed!")
 
 
 if __name__ == "__main__":
@@ -1,47 +1,174 @@
 #!/usr/bin/env python3
+import argparse
+import json
+import os
+import shutil
 import subprocess
 import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
+EXAMPLES_DIR = Path("legacy/examples")
+# Targets checked and tested per example; examples not listed use every target.
+TARGETS_PATH = Path(__file__).resolve().parent / "legacy-examples.json"
+ALL_TARGETS = ["wasm", "wasm-gc", "js", "native"]
+
+
+def examples():
+    """Return the legacy example projects."""
+    return [
+        example for example in sorted(EXAMPLES_DIR.iterdir())
+        if example.is_dir() and not example.name.startswith('.') and example.name != "target"
+    ]
+
+
+def load_targets():
+    with open(TARGETS_PATH, "r") as file:
+        return json.load(file)
+
+
+def steps(example, targets):
+    """Return the (target, [step, ...]) cells of an example, steps in order."""
+    rules = targets.get(example.name, {"check": ALL_TARGETS, "test": ALL_TARGETS})
+    cells = []
+    for target in ALL_TARGETS:
+        cell = [step for step in ("check", "test") if target in rules.get(step, [])]
+        if cell:
+            cells.append((target, cell))
+    return cells
+
+
+def dependency_key(example):
+    """Return a key identifying the dependencies of an example."""
+    with open(example / "moon.mod.json", "r") as file:
+        module = json.load(file)
+    return json.dumps(module.get("deps", {}), sort_keys=True)
+
+
+def run(command, cwd):
+    """Run a command, returning whether it passed, its output and wall time."""
+    start = time.perf_counter()
+    result = subprocess.run(
+        command,
+        cwd=cwd,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        text=True,
+    )
+    return result.returncode == 0, result.stdout, time.perf_counter() - start
+
+
+class Installer:
+    """Runs moon install once per dependency set and copies the result."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # Dependency key -> {lock, source: example installed first, ok, output}
+        self.sets = {}
+
+    def install(self, example):
+        """Install the dependencies of an example, returning (passed, output, seconds)."""
+        key = dependency_key(example)
+        with self.lock:
+            state = self.sets.setdefault(key, {"lock": threading.Lock(), "source": None})
+        with state["lock"]:
+            start = time.perf_counter()
+            if state["source"] is None:
+                ok, output, seconds = run(["moon", "install"], example)
+                state.update(source=example, ok=ok, output=output)
+                return ok, output, seconds
+            if not state["ok"]:
+                return False, state["output"], 0.0
+            installed = state["source"] / ".mooncakes"
+            if installed.exists():
+                shutil.copytree(installed, example / ".mooncakes", dirs_exist_ok=True)
+            return True, f"Reused dependencies installed in {state['source'].name}\n", \
+                time.perf_counter() - start
+
+
+def check_cell(example, target, cell_steps):
+    """Run the steps of one example and target, stopping at the first failure."""
+    results = []
+    for step in cell_steps:
+        # A target directory per target lets the targets of an example run
+        # concurrently without waiting on each other's build lock.
+        ok, output, seconds = run(
+            ["moon", step, "--target", target, "--target-dir", f"target/{target}"],
+            example)
+        results.append((step, ok, output, seconds))
+        if not ok:
+            break
+    return results
+
+
+def check_example(executor, installer, example, targets):
+    """Install an example's dependencies, then check its cells on the pool."""
+    ok, output, seconds = installer.install(example)
+    cells = [("install", None, ok, output, seconds)]
+    if not ok:
+        return cells
+    futures = [
+        (target, executor.submit(check_cell, example, target, cell_steps))
+        for target, cell_steps in steps(example, targets)
+    ]
+    for target, future in futures:
+        for step, ok, output, seconds in future.result():
+            cells.append((step, target, ok, output, seconds))
+    return cells
+
 
 def main():
+    parser = argparse.ArgumentParser(
+        description="Check and test the legacy MoonBit examples")
+    parser.add_argument(
+        "-j", "--jobs",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="number of moon commands to run concurrently (default: all cores)")
+    parser.add_argument(
+        "examples",
+        nargs="*",
+        help="examples to check (default: all)")
+    args = parser.parse_args()
 
+    targets = load_targets()
+    selected = [
+        example for example in examples()
+        if not args.examples or example.name in args.examples
+    ]
+    installer = Installer()
     failed = []
-    for example in sorted(Path("legacy/examples").iterdir()):
-        if not example.is_dir() or example.name.startswith('.') or example.name == "target":
-            continue
-
-        # Skip wasi-http for non-wasm backends
-        check_targets = "all"
-        test_targets = "all"
-        if example.name == "wasi-http":
-            check_targets = "wasm"
-            test_targets = "wasm"
-        elif example.name in ["tetris", "mandelbrot", "koch_snowflake", "game_of_life"]:
-            check_targets = "wasm-gc"
-            test_targets = "wasm-gc"
-        elif example.name == "snake":
-            check_targets = "wasm,wasm-gc,js"
-            test_targets = None
-
-        print(f"Processing {example.name}")
-        try:
-            subprocess.run(["moon", "install"], cwd=example, check=True)
-            subprocess.run(
-                ["moon", "check", "--target", check_targets],
-                cwd=example,
-                check=True,
-            )
-            if test_targets is not None:
-                subprocess.run(
-                    ["moon", "test", "--target", test_targets],
-                    cwd=example,
-                    check=True,
-                )
-            print(f"OK: {example.name}")
-        except subprocess.CalledProcessError:
-            print(f"FAIL: {example.name}")
-            failed.append(example.name)
+    timings = []
+    start = time.perf_counter()
+    # Examples wait for their cells, so they get their own threads and only
+    # the cells compete for the bounded pool.
+    with ThreadPoolExecutor(max_workers=max(args.jobs, 1)) as executor, \
+            ThreadPoolExecutor(max_workers=max(len(selected), 1)) as examples_executor:
+        futures = [
+            examples_executor.submit(check_example, executor, installer, example, targets)
+            for example in selected
+        ]
+        # Each example's output is printed in one piece.
+        for example, future in zip(selected, futures):
+            print(f"Processing {example.name}")
+            ok = True
+            for step, target, passed, output, seconds in future.result():
+                cell = step if target is None else f"{step} {target}"
+                print(output, end="", flush=True)
+                print(f"  {cell}: {'ok' if passed else 'FAILED'} in {seconds:.2f}s")
+                timings.append((seconds, f"{example.name}: {cell}"))
+                ok = ok and passed
+            if ok:
+                print(f"OK: {example.name}")
+            else:
+                print(f"FAIL: {example.name}")
+                failed.append(example.name)
+
+    print(f"\nWall time {time.perf_counter() - start:.2f}s, slowest cells:")
+    for seconds, cell in sorted(timings, reverse=True)[:10]:
+        print(f"  {seconds:8.2f}s  {cell}")
 
     if failed:
         print(f"\nFailed: {', '.join(failed)}")
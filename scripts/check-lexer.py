@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""Check that the MoonBit lexer gives the same tokens as Pygments' RegexLexer.
+
+MoonBitLexer only tries the rules whose regex can start with the next
+character, which is worked out from the parsed regexes. This script lexes
+every MoonBit snippet of the repo, the ``.mbt`` files and the moonbit fences
+of the Markdown pages, plus random and truncated inputs, with both
+MoonBitLexer and ``RegexLexer.get_tokens_unprocessed`` and reports the first
+difference of every input that does not give the same tokens. Run it after
+changing a rule of the lexer or upgrading Pygments or Python.
+
+With ``--timing``, the time to lex every snippet with both is reported too.
+
+    python scripts/check-lexer.py
+    python scripts/check-lexer.py --random 20000 --timing
+"""
+
+import argparse
+import random
+import re
+import sys
+import time
+from pathlib import Path
+
+from pygments.lexer import RegexLexer
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT_DIR / "next" / "_ext"))
+from lexer import MoonBitLexer  # noqa: E402
+
+SNIPPET_DIRS = [
+    ROOT_DIR / "next" / "sources",
+    ROOT_DIR / "next" / "snippets",
+    ROOT_DIR / "legacy",
+]
+PAGES_DIR = ROOT_DIR / "next"
+IGNORED_DIRS = {"target", ".mooncakes", "_build", "node_modules", "locales"}
+FENCE = re.compile(r"^\s*(`{3,}|~{3,})\s*(?:\{code-block\}\s*)?(?:moonbit|mbt)\b")
+# Characters the rules care about, for the random inputs.
+ALPHABET = "abcdefxyzABCDEFLUPp0123456789_ \t\n\"'`\\#$|{}()[]<>.,:;=+-*/%&!?@~^bB"
+
+
+def ignored(path):
+    return bool(IGNORED_DIRS.intersection(path.parts))
+
+
+def fences(path):
+    """Return the MoonBit code blocks of a Markdown page."""
+    blocks = []
+    lines = None
+    marker = None
+    for line in path.read_text(encoding="utf-8").splitlines(keepends=True):
+        if lines is None:
+            match = FENCE.match(line)
+            if match:
+                marker = match.group(1)
+                lines = []
+        elif line.strip() == marker:
+            blocks.append("".join(lines))
+            lines = None
+        elif not line.lstrip().startswith(":"):
+            # Directive options are not code.
+            lines.append(line)
+    return blocks
+
+
+def snippets():
+    """Return (name, text) for every MoonBit snippet of the repo."""
+    result = []
+    for directory in SNIPPET_DIRS:
+        for path in sorted(directory.rglob("*.mbt")):
+            if not ignored(path.relative_to(ROOT_DIR)):
+                result.append((path.relative_to(ROOT_DIR).as_posix(), path.read_text(encoding="utf-8")))
+    for path in sorted(PAGES_DIR.rglob("*.md")):
+        if ignored(path.relative_to(ROOT_DIR)):
+            continue
+        for index, text in enumerate(fences(path)):
+            result.append((f"{path.relative_to(ROOT_DIR).as_posix()}#{index + 1}", text))
+    return result
+
+
+def random_inputs(texts, count, seed):
+    """Return (name, text) for random strings and random slices of snippets."""
+    rng = random.Random(seed)
+    result = []
+    for index in range(count):
+        if texts and index % 2:
+            text = rng.choice(texts)
+            start = rng.randrange(len(text) + 1)
+            text = text[start:start + rng.randrange(1, 200)]
+        else:
+            text = "".join(rng.choice(ALPHABET) for _ in range(rng.randrange(1, 80)))
+        result.append((f"random #{index + 1}", text))
+    return result
+
+
+def reference_tokens(lexer, text):
+    return list(RegexLexer.get_tokens_unprocessed(lexer, text))
+
+
+def first_difference(expected, actual):
+    """Return a description of the first token that differs."""
+    for index, (want, got) in enumerate(zip(expected, actual)):
+        if want != got:
+            return f"token {index}: expected {want!r}, got {got!r}"
+    if len(expected) > len(actual):
+        return f"token {len(actual)}: expected {expected[len(actual)]!r}, got nothing"
+    return f"token {len(expected)}: expected nothing, got {actual[len(expected)]!r}"
+
+
+def best_time(function, texts, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for text in texts:
+            function(text)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the MoonBit lexer with Pygments' RegexLexer")
+    parser.add_argument(
+        "--random",
+        type=int,
+        default=2000,
+        help="number of random inputs to compare as well (default: 2000)")
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=0,
+        help="seed of the random inputs (default: 0)")
+    parser.add_argument(
+        "--timing",
+        action="store_true",
+        help="also report the time to lex every snippet with both lexers")
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=3,
+        help="number of timing runs, of which the best is reported (default: 3)")
+    args = parser.parse_args()
+
+    lexer = MoonBitLexer()
+    inputs = snippets()
+    texts = [text for _, text in inputs]
+    inputs += random_inputs(texts, args.random, args.seed)
+
+    failed = []
+    for name, text in inputs:
+        expected = reference_tokens(lexer, text)
+        actual = list(lexer.get_tokens_unprocessed(text))
+        if actual != expected:
+            failed.append(name)
+            print(f"{name}: {first_difference(expected, actual)}")
+    print(f"{len(inputs)} inputs compared ({len(texts)} snippets), {len(failed)} with different tokens")
+
+    if args.timing:
+        reference = best_time(lambda text: reference_tokens(lexer, text), texts, args.repeat)
+        dispatch = best_time(lambda text: list(lexer.get_tokens_unprocessed(text)), texts, args.repeat)
+        print(f"Lexing {len(texts)} snippets: RegexLexer {reference:.3f}s, "
+              f"MoonBitLexer {dispatch:.3f}s ({reference / dispatch:.1f}x)")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
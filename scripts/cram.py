@@ -0,0 +1,358 @@
+#!/usr/bin/env python3
+"""Run cram command transcripts, like ``scrut test --shell bash``.
+
+A transcript is a text file in which indented ``  $ command`` lines, continued
+by ``  > `` lines, are followed by their expected output indented by two
+spaces. An expected line may end with `` (re)`` or `` (glob)`` to match a
+pattern; lines with unprintable characters are written escaped with
+`` (esc)``, a last line without a newline ends with `` (no-eol)`` and a
+nonzero exit status is written ``[status]``. Unindented lines are comments.
+
+Each comment that follows commands starts a new case. Cases are independent:
+each runs in its own bash, in a fresh temporary directory that is also
+``TMPDIR``, with ``TESTDIR`` set to the directory of the transcript, so they
+run concurrently. Commands that depend on each other belong to one case.
+
+The outputs of passing cases are cached by their commands, the files of the
+transcript's directory they refer to and the moon toolchain version, so an
+unchanged case is not run again while its expected output still matches.
+
+    python scripts/cram.py
+    python scripts/cram.py next/sources/script-mode/script-mode.cram --no-cache
+"""
+
+import argparse
+import difflib
+import hashlib
+import json
+import os
+import re
+import secrets
+import shlex
+import shutil
+import subprocess
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+SOURCES_DIR = ROOT_DIR / "next" / "sources"
+CACHE_PATH = ROOT_DIR / "next" / "_build" / "cache" / "cram.json"
+CACHE_VERSION = 1
+IGNORED_DIRS = {"target", ".mooncakes", "_build"}
+
+
+class Command:
+    def __init__(self, line, source):
+        # Index of the $ line in the transcript.
+        self.line = line
+        self.source = source
+        # Number of transcript lines of the command itself.
+        self.length = 1
+        self.expected = []
+
+
+class Case:
+    def __init__(self, path, title):
+        self.path = path
+        self.title = title
+        self.commands = []
+
+
+def transcripts(directory=SOURCES_DIR):
+    """Return the transcripts under a directory."""
+    return sorted(
+        path for path in Path(directory).rglob("*.cram")
+        if not IGNORED_DIRS.intersection(path.parts)
+    )
+
+
+def parse(path):
+    """Return the cases of a transcript."""
+    path = Path(path)
+    cases = []
+    case = None
+    command = None
+    for number, line in enumerate(path.read_text().splitlines()):
+        if line.startswith("  $ "):
+            if case is None:
+                case = Case(path, "")
+                cases.append(case)
+            command = Command(number, line[4:])
+            case.commands.append(command)
+        elif line.startswith("  > ") and command is not None and not command.expected:
+            command.source += "\n" + line[4:]
+            command.length += 1
+        elif line.startswith("  ") and command is not None:
+            command.expected.append(line[2:])
+        else:
+            command = None
+            if line.strip() and (case is None or case.commands):
+                case = Case(path, line.strip())
+                cases.append(case)
+    return [case for case in cases if case.commands]
+
+
+def toolchain_version():
+    """Return the moon toolchain version, or an empty string if unavailable."""
+    try:
+        result = subprocess.run(
+            ["moon", "version", "--all"], capture_output=True, text=True, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+    return result.stdout.strip()
+
+
+def referenced_files(case):
+    """Return the files of the transcript's directory that a case refers to."""
+    directory = case.path.parent.resolve()
+    found = set()
+    for command in case.commands:
+        try:
+            tokens = shlex.split(command.source, comments=True)
+        except ValueError:
+            tokens = command.source.split()
+        for token in tokens:
+            token = token.replace("${TESTDIR}", str(directory)).replace("$TESTDIR", str(directory))
+            try:
+                path = (directory / token).resolve()
+                if path == directory or not path.is_relative_to(directory) or not path.exists():
+                    continue
+            except OSError:
+                # Tokens such as long programs passed to moon run -c are not paths.
+                continue
+            if path.is_file():
+                found.add(path)
+                continue
+            for root, dirs, files in os.walk(path):
+                dirs[:] = [name for name in dirs if name not in IGNORED_DIRS]
+                found.update(Path(root) / name for name in files)
+    return sorted(found)
+
+
+def case_key(case, version):
+    """Return the cache key of a case."""
+    digest = hashlib.sha256(f"{version}\0".encode())
+    for command in case.commands:
+        digest.update(f"{command.source}\0".encode())
+    directory = case.path.parent.resolve()
+    for path in referenced_files(case):
+        digest.update(f"{path.relative_to(directory).as_posix()}\0".encode())
+        digest.update(hashlib.sha256(path.read_bytes()).digest())
+    return digest.hexdigest()
+
+
+def load_cache(path=CACHE_PATH):
+    try:
+        cache = json.loads(Path(path).read_text())
+    except (OSError, ValueError):
+        return {}
+    if cache.get("version") != CACHE_VERSION:
+        return {}
+    return cache["cases"]
+
+
+def save_cache(cache, path=CACHE_PATH):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = path.with_suffix(".tmp")
+    temp_path.write_text(json.dumps({"version": CACHE_VERSION, "cases": cache}, indent=1) + "\n")
+    os.replace(temp_path, path)
+
+
+def run_case(case):
+    """Run the commands of a case in one shell.
+
+    Returns a list of (output, status) per command. When the shell exits,
+    the status of the command that made it exit is None, and the commands
+    after it have None for both.
+    """
+    salt = f"CRAM{secrets.token_hex(8)}"
+    script = []
+    for index, command in enumerate(case.commands):
+        script.append(command.source)
+        script.append(f'__status=$?; printf "\\n{salt} {index} %d\\n" "$__status"')
+    with tempfile.TemporaryDirectory(prefix="cram-") as temp:
+        work = Path(temp) / "work"
+        work.mkdir()
+        script_path = Path(temp) / "script.sh"
+        script_path.write_text("\n".join(script) + "\n")
+        env = dict(
+            os.environ,
+            TMPDIR=str(work),
+            TESTDIR=str(case.path.parent.resolve()),
+            TESTFILE=case.path.name,
+            LANG="C",
+            LC_ALL="C",
+            TZ="GMT",
+            COLUMNS="80",
+        )
+        # On Windows a bare "bash" may start WSL's from System32 instead of
+        # the one on PATH.
+        result = subprocess.run(
+            [shutil.which("bash") or "bash", str(script_path)],
+            cwd=work,
+            env=env,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+        )
+    rest = result.stdout.decode("utf-8", "replace")
+    results = []
+    for index in range(len(case.commands)):
+        marker = f"\n{salt} {index} "
+        position = rest.find(marker)
+        if position < 0:
+            results.append((rest, None))
+            results.extend((None, None) for _ in case.commands[index + 1:])
+            break
+        end = rest.find("\n", position + len(marker))
+        results.append((rest[:position], int(rest[position + len(marker):end])))
+        rest = rest[end + 1:]
+    return results
+
+
+def output_lines(output, status):
+    """Return the transcript lines of a command's output."""
+    lines = output.split("\n")
+    if lines[-1] == "":
+        lines.pop()
+    else:
+        lines[-1] += " (no-eol)"
+    lines = [
+        line if line.isprintable() else line.encode("unicode_escape").decode("ascii") + " (esc)"
+        for line in lines
+    ]
+    if status:
+        lines.append(f"[{status}]")
+    return lines
+
+
+def matches(expected, actual):
+    if expected == actual:
+        return True
+    if expected.endswith(" (re)"):
+        try:
+            return re.fullmatch(expected[:-5], actual) is not None
+        except re.error:
+            return False
+    if expected.endswith(" (glob)"):
+        pattern = re.escape(expected[:-7]).replace(r"\*", ".*").replace(r"\?", ".")
+        return re.fullmatch(pattern, actual) is not None
+    return False
+
+
+def actual_lines(command, output, status):
+    """Return a command's output lines, keeping the expected lines they match."""
+    lines = output_lines(output, status)
+    for index, line in enumerate(lines[:len(command.expected)]):
+        if matches(command.expected[index], line):
+            lines[index] = command.expected[index]
+    return lines
+
+
+def passed(case, results):
+    return all(
+        status is not None and actual_lines(command, output, status) == command.expected
+        for command, (output, status) in zip(case.commands, results)
+    )
+
+
+def check_case(case, cache, version):
+    """Run a case unless its cached outputs still pass.
+
+    Returns (results, cached).
+    """
+    key = case_key(case, version) if cache is not None else None
+    if key is not None and key in cache:
+        results = [tuple(result) for result in cache[key]]
+        if passed(case, results):
+            return results, True
+    results = run_case(case)
+    if key is not None and passed(case, results):
+        cache[key] = [list(result) for result in results]
+    return results, False
+
+
+def report(path, cases, results):
+    """Return whether the cases of a transcript passed, and their report.
+
+    Failures are shown as a unified diff between the transcript and its
+    actual output.
+    """
+    lines = Path(path).read_text().splitlines()
+    actual = list(lines)
+    output = []
+    ok = True
+    # Replace expected outputs from the end so line numbers stay valid.
+    replacements = []
+    for case, (case_results, cached) in zip(cases, results):
+        case_ok = passed(case, case_results)
+        ok = ok and case_ok
+        title = case.title or f"line {case.commands[0].line + 1}"
+        state = "ok" if case_ok else "FAILED"
+        output.append(f"  {title}: {state}{' (cached)' if cached else ''}\n")
+        for command, (command_output, status) in zip(case.commands, case_results):
+            start = command.line + command.length
+            if command_output is None:
+                new = ["  [command did not run]"]
+            elif status is None:
+                new = [f"  {line}" for line in output_lines(command_output, 0)]
+                new.append("  [shell exited]")
+            else:
+                new = [f"  {line}" for line in actual_lines(command, command_output, status)]
+            replacements.append((start, start + len(command.expected), new))
+    for start, end, new in sorted(replacements, reverse=True):
+        actual[start:end] = new
+    if not ok:
+        output.extend(
+            line + "\n" for line in difflib.unified_diff(
+                lines, actual, f"{path}", f"{path}.err", lineterm=""))
+    return ok, "".join(output)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run cram command transcripts")
+    parser.add_argument(
+        "-j", "--jobs",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="number of cases to run concurrently (default: all cores)")
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="run every case, ignoring and not updating the cache")
+    parser.add_argument(
+        "paths",
+        nargs="*",
+        help="transcripts to run (default: every transcript under next/sources)")
+    args = parser.parse_args()
+
+    paths = [Path(path) for path in args.paths] or transcripts()
+    cache = None if args.no_cache else load_cache()
+    version = toolchain_version()
+    failed = []
+    with ThreadPoolExecutor(max_workers=max(args.jobs, 1)) as executor:
+        futures = {
+            path: [(case, executor.submit(check_case, case, cache, version)) for case in parse(path)]
+            for path in paths
+        }
+        for path, cases in futures.items():
+            ok, output = report(path, [case for case, _ in cases], [future.result() for _, future in cases])
+            print(f"Processing {path}")
+            print(output, end="", flush=True)
+            if not ok:
+                failed.append(str(path))
+    if cache is not None:
+        save_cache(cache)
+
+    if failed:
+        print(f"\nFailed: {', '.join(failed)}")
+        return 1
+    print("\nAll transcripts passed!")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())